@@ -0,0 +1,218 @@
+"""Замер задержки автодополнения на больших файлах.
+
+Загружает в CodeEditor сгенерированные Python-файлы заданного размера и
+много раз запрашивает дополнение в случайных местах: после каждой вставки
+пересчитывается индекс имён буфера, затем работают все источники - буфер,
+встроенные имена, индекс сгенерированного проекта и имена модулей после
+точки (os.pa, json.du, модуль проекта). Печатает p50/p95/p99 по этапам
+(symbol_index_edit, get_completions, show_completions, all_providers и
+каждый источник отдельно).
+
+    python benchmark.py
+    python benchmark.py --sizes 1000 10000 --queries 100 --modules 500 --json result.json
+
+Без дисплея (Linux, нет DISPLAY) запускает виртуальный Xvfb, если он установлен.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tkinter as tk
+
+from ui.code_editor import CodeEditor
+from ui.latency import stats
+from ui.module_members import ModuleMembers
+from ui.project_index import ProjectIndex
+
+# Сколько ждём ответа асинхронных источников на один запрос
+REQUEST_TIMEOUT = 2.0
+# Сколько ждём индексации проекта и импорта модулей перед замерами
+WARMUP_TIMEOUT = 60.0
+# Модули, имена которых дополняются после точки
+MODULES = ["os", "os.path", "json", "collections"]
+# Доля запросов после точки
+DOTTED_SHARE = 0.2
+SYLLABLES = ["get", "set", "load", "save", "item", "user", "data", "value", "path",
+             "node", "tree", "config", "parse", "token", "index", "cache", "file", "name"]
+
+
+def start_virtual_display():
+    """Поднимает Xvfb и возвращает его процесс или None, если дисплей уже есть"""
+    if os.environ.get("DISPLAY") or not sys.platform.startswith("linux"):
+        return None
+    xvfb = shutil.which("Xvfb")
+    if not xvfb:
+        sys.exit("Нет дисплея и не найден Xvfb - установите его или задайте DISPLAY")
+    display = f":{random.randint(100, 999)}"
+    process = subprocess.Popen([xvfb, display, "-screen", "0", "1280x1024x24", "-nolisten", "tcp"],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.environ["DISPLAY"] = display
+    time.sleep(0.5)
+    return process
+
+
+def make_project(root, module_count, seed=0):
+    """Пакет из module_count модулей с функциями и классами; имена модулей"""
+    rng = random.Random(seed)
+    modules = []
+    for i in range(module_count):
+        module = f"mod{i}"
+        lines = ["import os", ""]
+        for _ in range(rng.randint(5, 15)):
+            name = "_".join(rng.sample(SYLLABLES, 2)) + str(rng.randint(0, 99))
+            if rng.random() < 0.7:
+                lines += [f"def {name}(path, value=None):", "    return os.path.join(path, str(value))", ""]
+            else:
+                lines += [f"class {name.title().replace('_', '')}:",
+                          "    def __init__(self, path):", "        self.path = path", ""]
+        with open(os.path.join(root, f"{module}.py"), "w", encoding="utf-8") as f:
+            f.write("\n".join(lines))
+        modules.append(module)
+    return modules
+
+
+def warm_up(project, members):
+    """Ждёт индекса проекта и имён модулей: замеряем работу, а не первый импорт"""
+    deadline = time.perf_counter() + WARMUP_TIMEOUT
+    while time.perf_counter() < deadline:
+        missing = [module for module in MODULES if members.members(module) is None]
+        if project.ready and not missing:
+            return
+        time.sleep(0.05)
+    sys.exit("Не дождались индекса проекта или имён модулей")
+
+
+def make_source(line_count, modules, seed=0):
+    """Похожий на настоящий код файл из line_count строк, имена из него
+    и начала запросов после точки"""
+    rng = random.Random(seed)
+    names = []
+    imported = rng.sample(modules, min(3, len(modules)))
+    lines = ["import os", "import json", "import collections"] + [f"import {module}" for module in imported] + [""]
+    dotted = ["os.pa", "os.path.jo", "json.du", "collections.Or"] + [f"{module}." for module in imported]
+    while len(lines) < line_count:
+        name = "_".join(rng.sample(SYLLABLES, rng.randint(2, 3))) + str(rng.randint(0, 99))
+        names.append(name)
+        kind = rng.random()
+        if kind < 0.3:
+            lines += [f"def {name}(path, value=None):",
+                      "    result = os.path.join(path, str(value))",
+                      "    return json.dumps(result)", ""]
+        elif kind < 0.45:
+            lines += [f"class {name.title().replace('_', '')}:",
+                      f"    def __init__(self, {name}):",
+                      f"        self.{name} = {name}", ""]
+        else:
+            lines.append(f"{name} = {rng.randint(0, 1000)}  # {name}")
+    return "\n".join(lines[:line_count]), names, dotted
+
+
+def wait_for_request(root, autocomplete):
+    """Крутит цикл событий, пока не ответят все асинхронные источники"""
+    deadline = time.perf_counter() + REQUEST_TIMEOUT
+    while time.perf_counter() < deadline:
+        request = autocomplete._request
+        if request is None or request.done:
+            return
+        root.update()
+        time.sleep(0.001)
+
+
+def check_completions(prefix, completions):
+    """Предложение заменяет слово целиком: без точки в запросе - без точки
+    впереди, после точки - с тем же модулем. Иначе замер бессмыслен"""
+    module = prefix.rpartition('.')[0]
+    for word in completions:
+        if module and not word.startswith(module + '.') or not module and word.startswith('.'):
+            sys.exit(f"Неверное предложение {word!r} для {prefix!r}")
+
+
+def run_size(root, line_count, queries, seed, project, members, modules):
+    source, names, dotted = make_source(line_count, modules, seed)
+    editor = CodeEditor(root)
+    editor.pack(expand=True, fill="both")
+    editor.insert("1.0", source)
+    root.update()
+    start = time.perf_counter()
+    editor.symbol_index()
+    stats.record("symbol_index_build", time.perf_counter() - start)
+
+    autocomplete = editor.autocomplete
+    autocomplete.project_index = project
+    autocomplete.module_members = members
+    rng = random.Random(seed)
+    for _ in range(queries):
+        # Новая строка в случайном месте с началом случайного имени из файла
+        # или с обращением к модулю через точку
+        line = rng.randint(1, line_count)
+        if rng.random() < DOTTED_SHARE:
+            prefix = rng.choice(dotted)
+        else:
+            prefix = rng.choice(names)[:rng.randint(1, 4)]
+        editor.mark_set("insert", f"{line}.end")
+        editor.insert("insert", "\n" + prefix)
+        editor.see("insert")
+        # Правка помечает строки грязными - как при наборе перед дополнением
+        start = time.perf_counter()
+        editor.symbol_index()
+        stats.record("symbol_index_edit", time.perf_counter() - start)
+        autocomplete.show_completions()
+        wait_for_request(root, autocomplete)
+        check_completions(prefix, autocomplete.completions)
+        check_completions(prefix, autocomplete.get_completions(prefix))
+        autocomplete.hide_popup()
+        editor.delete(f"{line}.end", "insert")
+        root.update()
+
+    editor.destroy()
+    root.update()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Задержка автодополнения на файлах разного размера")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="число строк в файлах")
+    parser.add_argument("--queries", type=int, default=200, help="запросов дополнения на файл")
+    parser.add_argument("--modules", type=int, default=200, help="модулей в сгенерированном проекте")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="куда записать результаты в JSON")
+    args = parser.parse_args()
+
+    display = start_virtual_display()
+    results = {}
+    project_dir = tempfile.TemporaryDirectory(prefix="lumopy-bench-")
+    project = members = None
+    try:
+        modules = make_project(project_dir.name, args.modules, args.seed)
+        project = ProjectIndex(project_dir.name)
+        project.start()
+        members = ModuleMembers(sys.executable, cwd=project_dir.name)
+        warm_up(project, members)
+        root = tk.Tk()
+        root.geometry("1000x700")
+        for size in args.sizes:
+            stats.reset()
+            run_size(root, size, args.queries, args.seed, project, members, modules)
+            results[size] = stats.summary()
+            print(f"\n{size} строк:")
+            print(stats.report())
+        root.destroy()
+    finally:
+        if project:
+            project.close()
+        if members:
+            members.close()
+        project_dir.cleanup()
+        if display:
+            display.terminate()
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import tkinter as tk
+import keyword
+
+# Как часто переспрашиваем сигнатуру, пока модуль импортируется в фоне
+RETRY_DELAY = 300
+
+
+class CallTip:
+    """Подсказка с параметрами вызываемой функции.
+
+    Сигнатуры берутся только из готовых индексов: проекта (ProjectIndex) и
+    установленных модулей (ModuleMembers), поиск - словарём по полному имени.
+    Окно подсказки создаётся один раз и дальше только перенастраивается.
+    """
+
+    def __init__(self, editor):
+        self.editor = editor
+        self.window = None
+        self.label = None
+        self.anchor = None  # позиция открывающей скобки
+        self._shown = False
+        self._retry_id = None
+        self._waiting = False  # сигнатура может появиться, когда модуль импортируется
+        for sequence in ('<KeyRelease>', '<ButtonRelease-1>'):
+            editor.bind(sequence, self._check, add='+')
+        editor.bind('<FocusOut>', lambda e: editor.after_idle(self._check_focus), add='+')
+
+    def lookup(self, name):
+        """Строка вида name(параметры) или None, если сигнатура неизвестна"""
+        editor = self.editor
+        autocomplete = editor.autocomplete
+        project = autocomplete.project_index
+        members = autocomplete.module_members
+        editor.symbol_index()
+        # np.array -> numpy.array, OrderedDict -> collections.OrderedDict
+        module, _, attr = editor.symbols.resolve_module(name).rpartition('.')
+        candidates = [(module, attr)] if module else [(None, attr), ('builtins', attr)]
+        # obj.method - не модуль: импортируем только импортированное в буфере
+        imported = editor.symbols.is_imported(name)
+        self._waiting = False
+        for module, attr in candidates:
+            signature = project.signature(module, attr) if project else None
+            if (signature is None and members and module
+                    and (imported or module == 'builtins')
+                    and not (project and project.members(module) is not None)):
+                # Модуль проекта не импортируем - его сигнатуры только в ProjectIndex
+                signature = members.signature(module, attr)
+                self._waiting = self._waiting or members.is_pending(module)
+            if signature:
+                return f"{name}{signature}"
+        return None
+
+    def show_for(self, name, anchor):
+        """Показывает подсказку для name, если после anchor открыта скобка"""
+        self._cancel_retry()
+        if not name or name.endswith('.') or name[0].isdigit() or keyword.iskeyword(name):
+            return
+        self.anchor = self.editor.index(anchor)
+        text = self.lookup(name)
+        if text:
+            self._show(text)
+        elif self._waiting:
+            self._retry_id = self.editor.after(RETRY_DELAY, lambda: self._retry(name))
+
+    def hide(self, event=None):
+        self._cancel_retry()
+        self.anchor = None
+        if self._shown:
+            self.window.withdraw()
+            self._shown = False
+
+    def destroy(self):
+        self.hide()
+        if self.window:
+            self.window.destroy()
+            self.window = None
+
+    def _retry(self, name):
+        self._retry_id = None
+        if self.anchor and self._inside_call():
+            self.show_for(name, self.anchor)
+
+    def _cancel_retry(self):
+        if self._retry_id:
+            self.editor.after_cancel(self._retry_id)
+            self._retry_id = None
+
+    def _create_window(self):
+        self.window = tk.Toplevel(self.editor)
+        self.window.withdraw()
+        self.window.overrideredirect(True)
+        self.label = tk.Label(self.window, bg='#2d2d2d', fg='#ffffff', font=('Consolas', 10),
+                              relief='solid', bd=1, padx=4, pady=1, justify='left', wraplength=600)
+        self.label.pack()
+
+    def _show(self, text):
+        bbox = self.editor.bbox(self.anchor)
+        if not bbox:
+            return
+        if self.window is None:
+            self._create_window()
+        if self.label.cget('text') != text:
+            self.label.config(text=text)
+        x, y, w, h = bbox
+        # Над строкой, чтобы не закрывать список автодополнения под ней
+        self.window.geometry(f"+{self.editor.winfo_rootx() + x}+{self.editor.winfo_rooty() + y - h - 6}")
+        if not self._shown:
+            self.window.deiconify()
+            self._shown = True
+
+    def _inside_call(self):
+        """Курсор всё ещё внутри скобок вызова, начатого в anchor"""
+        insert = self.editor.index(tk.INSERT)
+        line, col = map(int, self.anchor.split('.'))
+        insert_line, insert_col = map(int, insert.split('.'))
+        if insert_line != line or insert_col <= col:
+            return False
+        depth = 0
+        for ch in self.editor.get(f"{self.anchor}+1c", insert):
+            if ch in '([{':
+                depth += 1
+            elif ch in ')]}':
+                depth -= 1
+                if depth < 0:
+                    return False
+        return True
+
+    def _check(self, event=None):
+        if self.anchor is not None and not self._inside_call():
+            self.hide()
+
+    def _check_focus(self):
+        # В список автодополнения фокус уходит ненадолго - подсказку оставляем
+        try:
+            focus = self.editor.focus_get()
+        except (KeyError, tk.TclError):
+            focus = None
+        if focus is None or (focus is not self.editor and focus.winfo_toplevel() is not self.editor.autocomplete.popup):
+            self.hide()
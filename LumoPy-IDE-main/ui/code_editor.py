@@ -1,9 +1,12 @@
 import tkinter as tk
 from tkinter import Text, Scrollbar
-from pygments import lex
-from pygments.lexers import PythonLexer, get_lexer_by_name, TextLexer
-from pygments.token import Token
 from ui.simple_autocomplete import SimpleAutocomplete
+from ui.call_tip import CallTip
+from ui.highlighter import IncrementalHighlighter, LexWorker, ROOT_STATE, STYLE_TAGS, lexer_for_extension
+from ui.theme import SYNTAX_COLORS
+from ui.symbol_table import SymbolTable
+from collections import deque
+import queue
 import time
 import os
 
@@ -38,75 +41,175 @@ class CodeEditor(Text):
         
         # Инициализируем простое автодополнение
         self.autocomplete = SimpleAutocomplete(self)
+        # Подсказка с параметрами функции при вводе (
+        self.call_tip = CallTip(self)
+        
+        # Версия документа растёт с каждой правкой; документ изменён, пока она
+        # не совпадает с сохранённой. <<DirtyChanged>> генерируется только при
+        # переходе между «сохранён» и «изменён», а не на каждое нажатие
+        self._edit_version = 0
+        self._saved_version = 0
+        self._modified = False
         
         # Определяем тип файла
         self.file_extension = None
-        self.lexer = PythonLexer()
+        self.lexer = None  # определяется лениво при первой подсветке
         
         # Переменные для оптимизации подсветки
         self._highlight_after_id = None
         self._highlight_delay = 500  # миллисекунды (увеличено с 300)
         
-        self._highlight()
+        # Лексирование идёт в фоновом потоке над снимком текста; результаты
+        # с устаревшей версией буфера отбрасываются, а теги накладываются
+        # порциями не дольше _tag_budget секунд за один проход цикла событий.
+        # Видимая область лексируется раньше остального файла
+        self._lex_worker = LexWorker()
+        self._version = 0
+        self._pending_lines = deque()
+        self._poll_after_id = None
+        self._tag_budget = 0.004
+        # Столько строк перекрашивается одним блоком; после блока проверяется
+        # время, чтобы большой участок не занимал цикл событий целиком
+        self._retag_lines = 100
+        self._visible_pending = False
+        # Строки, теги которых восстанавливаются из снимка вкладки
+        self._restored_lines = deque()
+        
+        # Инкрементальная подсветка: правки перехватываются на уровне
+        # Tcl-команды виджета, чтобы знать, какие строки изменились
+        self._highlighter = IncrementalHighlighter(self.lexer)
+        # Имена для автодополнения обновляются по тем же уведомлениям
+        self.symbols = SymbolTable()
+        # Теги - это классы стиля (keyword, string, ...), а не типы токенов
+        self._hl_tags = STYLE_TAGS
+        self._syntax_theme = None
+        self.set_syntax_theme("Тёмная")
+        self._orig_cmd = self._w + "_orig"
+        self.tk.call("rename", self._w, self._orig_cmd)
+        self.tk.createcommand(self._w, self._proxy)
+        
         # Добавляю тёмный скроллбар
         self.scrollbar = Scrollbar(master, command=self.yview, bg="#222", troughcolor="#111", activebackground="#444", highlightbackground="#111")
-        self['yscrollcommand'] = self.scrollbar.set
+        self['yscrollcommand'] = self._on_yscroll
 
     def set_file_extension(self, extension):
-        """Устанавливает расширение файла для правильной подсветки синтаксиса"""
+        """Устанавливает расширение файла для правильной подсветки синтаксиса.
+
+        Сам лексер берётся из общего кэша при следующей подсветке, поэтому
+        смена вкладки подсвечивает буфер один раз - в force_highlight.
+        """
+        if self.lexer is not None and extension == self.file_extension:
+            return
         self.file_extension = extension
-        if extension:
-            try:
-                if extension.lower() in ['.py', '.pyw']:
-                    self.lexer = PythonLexer()
-                elif extension.lower() in ['.js', '.javascript']:
-                    self.lexer = get_lexer_by_name('javascript')
-                elif extension.lower() in ['.html', '.htm']:
-                    self.lexer = get_lexer_by_name('html')
-                elif extension.lower() in ['.css']:
-                    self.lexer = get_lexer_by_name('css')
-                elif extension.lower() in ['.json']:
-                    self.lexer = get_lexer_by_name('json')
-                elif extension.lower() in ['.xml']:
-                    self.lexer = get_lexer_by_name('xml')
-                elif extension.lower() in ['.sql']:
-                    self.lexer = get_lexer_by_name('sql')
-                elif extension.lower() in ['.md', '.markdown']:
-                    self.lexer = get_lexer_by_name('markdown')
-                elif extension.lower() in ['.txt', '.text']:
-                    self.lexer = TextLexer()
-                else:
-                    # Пытаемся определить по расширению
-                    self.lexer = get_lexer_by_name(extension.lower()[1:])
-            except:
-                # Если не удалось определить, используем текстовый лексер
-                self.lexer = TextLexer()
+        self.lexer = None
+        self._highlighter.set_lexer(None)
+        self._invalidate_lex()
+
+    def _proxy(self, command, *args):
+        """Заменяет Tcl-команду виджета и отслеживает изменённые строки"""
+        try:
+            if command in ('insert', 'delete', 'replace'):
+                return self._tracked_edit(command, args)
+            return self.tk.call((self._orig_cmd, command) + args)
+        except tk.TclError:
+            # Ошибку нельзя пробрасывать из Tcl-команды: Tk сам оборачивает
+            # такие вызовы в catch (например, удаление пустого выделения)
+            return ""
+
+    def _line_count(self):
+        return int(str(self.tk.call(self._orig_cmd, "index", "end-1c")).split('.')[0])
+
+    def _tracked_edit(self, command, args):
+        # У insert индекс только первый аргумент, у replace - первые два,
+        # у delete все аргументы - индексы
+        if command == 'insert':
+            indices = args[:1]
+        elif command == 'replace':
+            indices = args[:2]
+        elif len(args) == 1:
+            # delete с одним индексом удаляет символ после него - это может
+            # быть перевод строки, тогда строка склеивается со следующей
+            indices = (args[0], f"{args[0]}+1c")
         else:
-            # Если расширение не указано, используем Python по умолчанию
-            self.lexer = PythonLexer()
-        self._highlight()
+            indices = args
+        lines_before = self._line_count()
+        lines = [int(str(self.tk.call(self._orig_cmd, "index", i)).split('.')[0]) for i in indices]
+        first = min(min(lines), lines_before)
+        old_last = min(max(lines), lines_before)
+        result = self.tk.call((self._orig_cmd, command) + args)
+        delta = self._line_count() - lines_before
+        new_last = old_last + delta
+        self._highlighter.splice(first - 1, old_last - 1, new_last - 1)
+        self.symbols.splice(first - 1, old_last - 1, new_last - 1)
+        restored = self._restored_lines
+        self._invalidate_lex()
+        if restored:
+            # Снимок ещё докрашивается: строки после правки сдвигаются, а
+            # изменённые перекрасит проход подсветки после неё
+            self._restored_lines = deque(
+                (line + delta if line > old_last - 1 else line, runs)
+                for line, runs in restored if not first - 1 <= line <= old_last - 1)
+        self._edit_version += 1
+        self._update_modified()
+        return result
+
+    def symbol_index(self):
+        """Индекс имён буфера; пересчитываются только изменённые строки"""
+        symbols = self.symbols
+        line_count = self._line_count()
+        if symbols.line_count != line_count:
+            # Изменение прошло мимо отслеживания - собираем имена заново
+            symbols.reset(line_count)
+        if symbols.dirty_lo is not None:
+            symbols.refresh(lambda lo, hi: self.get(f"{lo + 1}.0", f"{hi + 1}.end").split('\n'))
+        return symbols.index
+
+    def is_modified(self):
+        """Изменён ли документ с момента последнего сохранения"""
+        return self._modified
+
+    def mark_saved(self):
+        """Запоминает текущую версию документа как сохранённую"""
+        self._saved_version = self._edit_version
+        self._update_modified()
+
+    def _update_modified(self):
+        modified = self._edit_version != self._saved_version
+        if modified != self._modified:
+            self._modified = modified
+            self.event_generate("<<DirtyChanged>>", when="tail")
+
+    def _invalidate_lex(self):
+        """Буфер изменился: результаты фонового лексирования устарели"""
+        self._version += 1
+        self._pending_lines.clear()
+        self._restored_lines = deque()
 
     def _highlight(self, event=None):
         try:
-            code = self.get("1.0", tk.END)
-            if not code.strip():  # Если код пустой, не подсвечиваем
+            highlighter = self._highlighter
+            line_count = self._line_count()
+            if highlighter.line_count != line_count:
+                # Изменение прошло мимо отслеживания - подсвечиваем заново
+                highlighter.reset(line_count)
+                self._invalidate_lex()
+            if not highlighter.is_dirty:
                 return
-                
-            # Очищаем все существующие теги
-            self.tag_remove("Token", "1.0", tk.END)
-            
-            # Устанавливаем начальную позицию
-            self.mark_set("range_start", "1.0")
-            
-            # Используем текущий лексер для подсветки
-            for token, content in lex(code, self.lexer):
-                if content:  # Проверяем, что контент не пустой
-                    self.mark_set("range_end", f"range_start + {len(content)}c")
-                    self.tag_add(str(token), "range_start", "range_end")
-                    self.mark_set("range_start", "range_end")
-                    
-            # Применяем теги
-            self._set_tags()
+            if self.lexer is None:
+                if line_count == 1 and not self.get("1.0", "end-1c"):
+                    # Пустой буфер подсвечивать нечего - лексер пока не ищем
+                    return
+                self.lexer = lexer_for_extension(self.file_extension)
+                highlighter.set_lexer(self.lexer)
+            if highlighter.pass_line is None:
+                # Лексируем от ближайшей устойчивой строки до конца буфера:
+                # проход остановится, как только токены совпадут с прежними
+                first = highlighter.start_line()
+                code = self.get(f"{first + 1}.0", "end-1c")
+                stack = highlighter.begin(first)
+                self._lex_worker.submit_relex(self._version, self.lexer, code, first, stack)
+            self._visible_pending = True
+            self._poll_lex_results()
             
         except Exception as e:
             # Если подсветка не удалась, не делаем ничего
@@ -114,81 +217,180 @@ class CodeEditor(Text):
             print(f"Ошибка подсветки: {e}")
             pass
 
-    def _set_tags(self):
-        """Настройка цветовой схемы для Python"""
-        
-        # Основные токены Python
-        self.tag_configure(str(Token.Keyword), foreground="#569CD6")  # import, from, class, def, if, else, etc.
-        self.tag_configure(str(Token.Keyword.Namespace), foreground="#569CD6")  # import, from
-        self.tag_configure(str(Token.Keyword.Type), foreground="#569CD6")  # class, def
-        self.tag_configure(str(Token.Keyword.Constant), foreground="#569CD6")  # True, False, None
-        
-        # Встроенные функции и классы
-        self.tag_configure(str(Token.Name.Builtin), foreground="#4EC9B0")  # print, len, str, etc.
-        self.tag_configure(str(Token.Name.Builtin.Pseudo), foreground="#4EC9B0")  # self, cls
-        
-        # Строки
-        self.tag_configure(str(Token.Literal.String), foreground="#D69D85")
-        self.tag_configure(str(Token.Literal.String.Single), foreground="#D69D85")
-        self.tag_configure(str(Token.Literal.String.Double), foreground="#D69D85")
-        self.tag_configure(str(Token.Literal.String.Triple), foreground="#D69D85")
-        self.tag_configure(str(Token.Literal.String.Doc), foreground="#D69D85")
-        self.tag_configure(str(Token.Literal.String.Escape), foreground="#D69D85")
-        
-        # Комментарии
-        self.tag_configure(str(Token.Comment), foreground="#6A9955")
-        self.tag_configure(str(Token.Comment.Single), foreground="#6A9955")
-        self.tag_configure(str(Token.Comment.Multiline), foreground="#6A9955")
-        self.tag_configure(str(Token.Comment.Preproc), foreground="#6A9955")
-        
-        # Операторы
-        self.tag_configure(str(Token.Operator), foreground="#B4B4B4")
-        self.tag_configure(str(Token.Operator.Word), foreground="#B4B4B4")  # and, or, not, in, is
-        
-        # Функции и классы
-        self.tag_configure(str(Token.Name.Function), foreground="#DCDCAA")
-        self.tag_configure(str(Token.Name.Class), foreground="#4EC9B0")
-        self.tag_configure(str(Token.Name.Decorator), foreground="#DCDCAA")  # @decorator
-        
-        # Переменные и атрибуты
-        self.tag_configure(str(Token.Name), foreground="#FFFFFF")
-        self.tag_configure(str(Token.Name.Variable), foreground="#FFFFFF")
-        self.tag_configure(str(Token.Name.Attribute), foreground="#9CDCFE")
-        
-        # Числа
-        self.tag_configure(str(Token.Literal.Number), foreground="#B5CEA8")
-        self.tag_configure(str(Token.Literal.Number.Integer), foreground="#B5CEA8")
-        self.tag_configure(str(Token.Literal.Number.Float), foreground="#B5CEA8")
-        self.tag_configure(str(Token.Literal.Number.Hex), foreground="#B5CEA8")
-        self.tag_configure(str(Token.Literal.Number.Oct), foreground="#B5CEA8")
-        self.tag_configure(str(Token.Literal.Number.Bin), foreground="#B5CEA8")
-        
-        # Специальные токены
-        self.tag_configure(str(Token.Literal), foreground="#D69D85")
-        self.tag_configure(str(Token.Punctuation), foreground="#B4B4B4")
-        self.tag_configure(str(Token.Text), foreground="#FFFFFF")
-        self.tag_configure(str(Token.Text.Whitespace), foreground="#FFFFFF")
-        
-        # Дополнительные Python токены
-        self.tag_configure(str(Token.Name.Exception), foreground="#569CD6")
-        self.tag_configure(str(Token.Name.Label), foreground="#569CD6")
-        self.tag_configure(str(Token.Name.Entity), foreground="#569CD6")
-        
-        # Специальные символы
-        self.tag_configure(str(Token.Punctuation.Marker), foreground="#B4B4B4")
-        self.tag_configure(str(Token.Punctuation.Indicator), foreground="#B4B4B4")
-        
-        # Обработка ошибок
-        self.tag_configure(str(Token.Error), foreground="#F44747")
-        self.tag_configure(str(Token.Error.Token), foreground="#F44747")
-        
-        # Дополнительные токены
-        self.tag_configure(str(Token.Generic), foreground="#FFFFFF")
-        self.tag_configure(str(Token.Generic.Deleted), foreground="#F44747")
-        self.tag_configure(str(Token.Generic.Emph), foreground="#FFFFFF")
-        self.tag_configure(str(Token.Generic.Error), foreground="#F44747")
-        self.tag_configure(str(Token.Generic.Heading), foreground="#569CD6")
-        self.tag_configure(str(Token.Generic.Inserted), foreground="#6A9955")
+    def _request_visible(self):
+        """Просит фоновый поток сначала пролексировать видимые строки,
+        если последовательный проход до них ещё не дошёл"""
+        highlighter = self._highlighter
+        top = int(self.index("@0,0").split('.')[0]) - 1
+        bottom = int(self.index(f"@0,{self.winfo_height()}").split('.')[0]) - 1
+        if highlighter.start_line() >= top or highlighter.dirty_lo > bottom:
+            # Последовательный проход начнётся в видимой области или уже прошёл её
+            return
+        first = max(top, highlighter.dirty_lo)
+        code = self.get(f"{first + 1}.0", f"{bottom + 1}.end")
+        stack = highlighter.states[first] or ROOT_STATE
+        self._lex_worker.submit_preview(self._version, self.lexer, code, first, stack)
+
+    def _poll_lex_results(self):
+        """Накладывает теги по результатам фонового потока, пока не выйдет время"""
+        if self._poll_after_id:
+            self.after_cancel(self._poll_after_id)
+            self._poll_after_id = None
+        try:
+            highlighter = self._highlighter
+            if self._visible_pending and highlighter.is_dirty:
+                self._visible_pending = False
+                self._request_visible()
+            deadline = time.perf_counter() + self._tag_budget
+            finished = self._retag(self._lex_results(), deadline)
+            if not self._pending_lines and not self._restored_lines:
+                if not highlighter.is_dirty:
+                    return
+                if highlighter.pass_line is None:
+                    # Проход прерван правкой - новый запустит отложенная подсветка
+                    return
+            self._poll_after_id = self.after(1 if not finished else 10, self._poll_lex_results)
+        except Exception as e:
+            print(f"Ошибка подсветки: {e}")
+
+    def _lex_results(self):
+        """Строки, пролексированные фоновым потоком: (номер строки, runs или None)"""
+        highlighter = self._highlighter
+        worker = self._lex_worker
+        while self._restored_lines:
+            yield self._restored_lines.popleft()
+        while True:
+            if not self._pending_lines:
+                try:
+                    kind, version, first, lines, done = worker.results.get_nowait()
+                except queue.Empty:
+                    return
+                if kind == 'relex':
+                    worker.consumed()
+                if version != self._version:
+                    continue
+                if kind == 'preview':
+                    yield from highlighter.preview(first, lines)
+                    continue
+                self._pending_lines.extend(lines)
+                if done:
+                    self._pending_lines.append(None)
+            if highlighter.pass_line is None:
+                self._pending_lines.clear()
+                continue
+            item = self._pending_lines.popleft()
+            if item is None:
+                # Снимок текста кончился раньше прохода (не должно случаться) -
+                # проход перезапустит следующая подсветка
+                highlighter.pass_line = None
+                continue
+            runs, state = item
+            line = highlighter.pass_line
+            yield line, highlighter.step(runs, state)
+            if highlighter.pass_line is None:
+                # Токены совпали с прежними - дальше лексировать незачем
+                self._pending_lines.clear()
+                worker.cancel()
+
+    def highlight_snapshot(self):
+        """Снимок законченной подсветки буфера или None, если она ещё идёт"""
+        highlighter = self._highlighter
+        if self.lexer is None or highlighter.is_dirty or self._restored_lines:
+            return None
+        return self.lexer, list(highlighter.states), list(highlighter.runs)
+
+    def restore_highlight(self, snapshot):
+        """Восстанавливает подсветку из снимка без лексирования.
+
+        Снимок должен быть снят с того же текста, что сейчас в буфере.
+        Возвращает False, если снимок не подходит (другой лексер или число строк).
+        """
+        lexer, states, runs = snapshot
+        line_count = self._line_count()
+        if lexer is not lexer_for_extension(self.file_extension) or len(states) != line_count:
+            return False
+        if self._highlight_after_id:
+            self.after_cancel(self._highlight_after_id)
+            self._highlight_after_id = None
+        self.lexer = lexer
+        highlighter = self._highlighter
+        highlighter.set_lexer(lexer)
+        highlighter.states = list(states)
+        highlighter.runs = list(runs)
+        highlighter.dirty_lo = highlighter.dirty_hi = None
+        self._invalidate_lex()
+        self._lex_worker.cancel()
+        # Теги накладываются порциями в цикле событий, начиная с видимой области
+        top = int(self.index("@0,0").split('.')[0]) - 1
+        restored = self._restored_lines
+        restored.extend((line, runs[line]) for line in range(top, line_count))
+        restored.extend((line, runs[line]) for line in range(top))
+        self._poll_lex_results()
+        return True
+
+    def _on_yscroll(self, first, last):
+        self.scrollbar.set(first, last)
+        if self._highlighter.is_dirty:
+            # Прокрутка во время подсветки - видимые строки лексируются первыми
+            self._visible_pending = True
+
+    def _retag(self, changes, deadline=None):
+        """Перекрашивает только строки, токены которых изменились.
+
+        Возвращает False, если changes не исчерпан к моменту deadline.
+        """
+        block = []
+        for line, runs in changes:
+            if runs is not None:
+                if block and line != block[-1][0] + 1:
+                    self._retag_block(block)
+                    block = []
+                block.append((line, runs))
+                if len(block) >= self._retag_lines:
+                    self._retag_block(block)
+                    block = []
+            if deadline is not None and time.perf_counter() > deadline:
+                if block:
+                    self._retag_block(block)
+                return False
+        if block:
+            self._retag_block(block)
+        return True
+
+    def _retag_block(self, block):
+        # block - подряд идущие строки, снимаем с них все теги разом
+        start = f"{block[0][0] + 1}.0"
+        end = f"{block[-1][0] + 1}.end"
+        call = self.tk.call
+        orig = self._orig_cmd
+        for tag in self._hl_tags:
+            call(orig, "tag", "remove", tag, start, end)
+        # Соседние токены с одинаковым тегом склеиваем в один диапазон, а все
+        # диапазоны одного тега добавляем одним вызовом tag add
+        ranges = {}
+        for line, runs in block:
+            line += 1
+            run_tag = run_start = run_end = None
+            for col_start, col_end, tag in runs:
+                if tag == run_tag and col_start == run_end:
+                    run_end = col_end
+                    continue
+                if run_tag is not None:
+                    ranges.setdefault(run_tag, []).extend((f"{line}.{run_start}", f"{line}.{run_end}"))
+                run_tag, run_start, run_end = tag, col_start, col_end
+            if run_tag is not None:
+                ranges.setdefault(run_tag, []).extend((f"{line}.{run_start}", f"{line}.{run_end}"))
+        for tag, indices in ranges.items():
+            call(orig, "tag", "add", tag, *indices)
+
+    def set_syntax_theme(self, theme):
+        """Настраивает цвета классов подсветки; теги перенастраиваются только при смене темы"""
+        if theme == self._syntax_theme:
+            return
+        colors = SYNTAX_COLORS.get(theme, SYNTAX_COLORS["Тёмная"])
+        for tag in STYLE_TAGS:
+            self.tag_configure(tag, foreground=colors[tag])
+        self._syntax_theme = theme
 
     def _on_key_release(self, event=None):
         # Не запускаем подсветку при навигации стрелками
@@ -196,7 +398,7 @@ class CodeEditor(Text):
             return
             
         # Не запускаем подсветку если содержимое не изменилось
-        if not self.edit_modified():
+        if not self._highlighter.is_dirty:
             return
             
         # Немедленная подсветка для некоторых символов
@@ -270,8 +472,11 @@ class CodeEditor(Text):
         return "break"
 
     def _auto_pair(self, open_char, close_char):
+        name = self.autocomplete.get_current_word()[0] if open_char == '(' else ''
         self.insert("insert", open_char + close_char)
         self.mark_set("insert", "insert -1c")
+        if name:
+            self.call_tip.show_for(name, "insert -1c")
         return "break"
         
     def _trigger_autocomplete(self, event=None):
@@ -282,6 +487,7 @@ class CodeEditor(Text):
     def _hide_autocomplete(self, event=None):
         """Скрывает автодополнение"""
         self.autocomplete.hide_popup()
+        self.call_tip.hide()
         
     def force_highlight(self):
         """Принудительно запускает подсветку синтаксиса"""
@@ -331,6 +537,25 @@ class CodeEditor(Text):
             # Планируем новую подсветку с задержкой
             self._highlight_after_id = self.after(200, self._highlight)
 
+    def destroy(self):
+        if self._highlight_after_id:
+            self.after_cancel(self._highlight_after_id)
+            self._highlight_after_id = None
+        if self._poll_after_id:
+            self.after_cancel(self._poll_after_id)
+            self._poll_after_id = None
+        self._lex_worker.close()
+        self.call_tip.destroy()
+        self.autocomplete.destroy()
+        # Скроллбар создаётся в родителе редактора и сам не удалится
+        self.scrollbar.destroy()
+        super().destroy()
+        # Tk удаляет только переименованную команду, нашу - удаляем сами
+        try:
+            self.tk.deletecommand(self._w)
+        except tk.TclError:
+            pass
+
     def _on_right_click(self, event=None):
         """Обработчик правого клика мыши"""
         # Планируем подсветку после возможной вставки через контекстное меню
@@ -0,0 +1,248 @@
+import time
+from bisect import bisect_left
+from heapq import nlargest
+from itertools import compress
+
+# Больше любого символа: ключи с префиксом p лежат в [p, p + _MAX_CHAR)
+_MAX_CHAR = '\U0010ffff'
+
+# Столько масок отсеивается за раз между проверками бюджета времени
+MASK_SLICE = 4096
+
+
+def char_mask(key):
+    """Битовая маска символов строки: слово без какого-то символа запроса
+    отсекается одной проверкой (mask & query_mask) != query_mask"""
+    mask = 0
+    for ch in key:
+        mask |= 1 << (ord(ch) & 63)
+    return mask
+
+
+class PrefixIndex:
+    """Слова, отсортированные по casefold-ключу, с поиском по префиксу через bisect.
+
+    Поиск стоит O(log n + k). Если новый префикс продолжает предыдущий,
+    двоичный поиск идёт только внутри прошлого диапазона.
+    """
+
+    def __init__(self, words=()):
+        self.keys = []   # casefold-ключи по возрастанию
+        self.words = []  # слова в том же порядке
+        self.masks = []  # char_mask ключей в том же порядке
+        self.generation = 0  # растёт при каждом изменении набора слов
+        self._last = ('', 0, 0)
+        self.rebuild(words)
+
+    def rebuild(self, words):
+        pairs = sorted({(word.casefold(), word) for word in words})
+        self.keys = [key for key, _ in pairs]
+        self.words = [word for _, word in pairs]
+        self.masks = [char_mask(key) for key in self.keys]
+        self.generation += 1
+        self._last = ('', 0, len(self.keys))
+
+    def copy(self):
+        """Копия со своими списками: её можно менять, пока читают оригинал"""
+        index = PrefixIndex()
+        index.keys = self.keys[:]
+        index.words = self.words[:]
+        index.masks = self.masks[:]
+        index.generation = self.generation + 1
+        return index
+
+    def _find(self, key, word):
+        i = bisect_left(self.keys, key)
+        while i < len(self.keys) and self.keys[i] == key and self.words[i] < word:
+            i += 1
+        return i
+
+    def add(self, word):
+        key = word.casefold()
+        i = self._find(key, word)
+        if i < len(self.words) and self.words[i] == word:
+            return
+        self.keys.insert(i, key)
+        self.words.insert(i, word)
+        self.masks.insert(i, char_mask(key))
+        self.generation += 1
+        self._last = ('', 0, len(self.keys))
+
+    def discard(self, word):
+        i = self._find(word.casefold(), word)
+        if i < len(self.words) and self.words[i] == word:
+            del self.keys[i]
+            del self.words[i]
+            del self.masks[i]
+            self.generation += 1
+            self._last = ('', 0, len(self.keys))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def range(self, prefix):
+        """Диапазон индексов слов, начинающихся с prefix (без учёта регистра)"""
+        prefix = prefix.casefold()
+        last_prefix, lo, hi = self._last
+        if not prefix.startswith(last_prefix):
+            lo, hi = 0, len(self.keys)
+        keys = self.keys
+        lo = bisect_left(keys, prefix, lo, hi)
+        hi = bisect_left(keys, prefix + _MAX_CHAR, lo, hi)
+        self._last = (prefix, lo, hi)
+        return lo, hi
+
+    def items(self, prefix, limit=None):
+        """Пары (ключ, слово) с префиксом prefix в порядке ключей"""
+        lo, hi = self.range(prefix)
+        if limit is not None:
+            hi = min(hi, lo + limit)
+        return zip(self.keys[lo:hi], self.words[lo:hi])
+
+    def search(self, prefix, limit=20):
+        return [word for _, word in self.items(prefix, limit)]
+
+
+def _is_boundary(word, i):
+    # Начало слова, после _ . или цифры/знака, либо заглавная после строчной (camelCase)
+    if i == 0:
+        return True
+    prev, ch = word[i - 1], word[i]
+    return not prev.isalpha() or (ch.isupper() and prev.islower())
+
+
+def _fits(query, start, key):
+    # Помещается ли query подпоследовательностью в key[start:]
+    for ch in query:
+        start = key.find(ch, start) + 1
+        if not start:
+            return False
+    return True
+
+
+def fuzzy_score(query, word, key):
+    """Оценка совпадения query (уже casefold) подпоследовательностью с word.
+
+    key - word.casefold(). Префикс оценивается выше всего; дальше бонусы
+    за начала частей snake_case/camelCase и подряд идущие символы, штраф
+    за пропуски. None, если query не подпоследовательность word.
+    """
+    if key.startswith(query):
+        return 1000 - len(key)
+    score = 0
+    prev = -1
+    n = len(key)
+    for qi, ch in enumerate(query):
+        if prev + 1 < n and key[prev + 1] == ch:
+            pos = prev + 1
+        else:
+            pos = key.find(ch, prev + 1)
+            if pos < 0:
+                return None
+            # Совпадение на границе части слова лучше, если остаток запроса
+            # после неё всё ещё помещается
+            k = pos
+            while k >= 0 and not _is_boundary(word, k):
+                k = key.find(ch, k + 1)
+            if k >= 0 and _fits(query[qi + 1:], k + 1, key):
+                pos = k
+        score += 10
+        if _is_boundary(word, pos):
+            score += 15
+        if pos == prev + 1:
+            score += 20
+        else:
+            score -= min(pos - prev - 1, 5)
+        prev = pos
+    return score - (n - len(query)) // 4
+
+
+class FuzzyMatcher:
+    """Ранжированный нечёткий поиск по нескольким PrefixIndex.
+
+    Кандидаты отсекаются по маске символов, оставшиеся оцениваются
+    fuzzy_score с добавками за недавнее использование и близость к курсору.
+    Проход ограничен бюджетом времени: что не успели оценить - пропускаем.
+    Если запрос продолжает предыдущий, просматриваются только слова,
+    прошедшие прошлый запрос. Несколько матчеров могут вести общий учёт
+    недавних слов: history - матчер, у которого он хранится.
+    """
+
+    def __init__(self, budget=0.005, history=None):
+        self.budget = budget
+        self.history = history or self
+        self.recent = {}  # слово -> номер последнего использования
+        self._uses = 0
+        self._last = (None, None, None)  # (query, версии индексов, выжившие слова)
+
+    def note_used(self, word):
+        history = self.history
+        history._uses += 1
+        history.recent[word] = history._uses
+
+    def _candidates(self, indexes, query, query_mask, deadline):
+        """Пары (ключ, слово), прошедшие маску; None - время вышло"""
+        versions = tuple((id(index), index.generation) for index in indexes)
+        last_query, last_versions, survivors = self._last
+        if last_query is not None and versions == last_versions and query.startswith(last_query):
+            yield from survivors
+            return
+        # Отсев по маске в C: compress по map без цикла на Python. Маски
+        # идут кусками - если маску не проходит ничего, кандидатов нет и
+        # бюджет проверяется только между кусками
+        has_all = query_mask.__eq__
+        for index in indexes:
+            keys, words, masks = index.keys, index.words, index.masks
+            for start in range(0, len(masks), MASK_SLICE):
+                if time.perf_counter() > deadline:
+                    yield None
+                    return
+                end = start + MASK_SLICE
+                keep = map(has_all, map(query_mask.__and__, masks[start:end]))
+                yield from compress(zip(keys[start:end], words[start:end]), keep)
+
+    def search(self, indexes, query, limit=20, nearby=()):
+        return [word for word, _ in self.search_scored(indexes, query, limit, nearby)]
+
+    def search_scored(self, indexes, query, limit=20, nearby=()):
+        """Лучшие пары (слово, оценка) - по ним сливаются результаты разных источников"""
+        if not query:
+            return []
+        query = query.casefold()
+        query_mask = char_mask(query)
+        deadline = time.perf_counter() + self.budget
+        recent = self.history.recent
+        uses = self.history._uses
+        scored = {}
+        # Совпадения по префиксу находятся бинарным поиском и попадают
+        # в результат, даже если на остальное не хватит времени
+        for index in indexes:
+            for key, word in index.items(query, limit):
+                scored[word] = fuzzy_score(query, word, key)
+        survivors = []
+        complete = True
+        for n, candidate in enumerate(self._candidates(indexes, query, query_mask, deadline)):
+            if candidate is None or not n & 31 and time.perf_counter() > deadline:
+                complete = False
+                break
+            key, word = candidate
+            score = fuzzy_score(query, word, key)
+            if score is None:
+                continue
+            survivors.append((key, word))
+            if word in recent:
+                # Недавно выбранные слова поднимаются, свежие - выше
+                score += max(0, 40 - (uses - recent[word]))
+            if word in nearby:
+                score += 15
+            if scored.get(word, score - 1) < score:
+                scored[word] = score
+        versions = tuple((id(index), index.generation) for index in indexes)
+        # Неполный проход нельзя сужать дальше - следующий запрос начнёт заново
+        self._last = (query, versions, survivors) if complete else (None, None, None)
+        return nlargest(limit, scored.items(), key=rank)
+
+
+def rank(item):
+    """Ключ сортировки пар (слово, оценка): выше оценка, при равной - короче слово"""
+    return item[1], -len(item[0])
@@ -0,0 +1,156 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from heapq import nlargest
+from ui.completion_index import FuzzyMatcher, rank
+
+# Сколько предложений показываем
+LIMIT = 20
+
+_executor = None
+
+
+def executor():
+    """Общий для всех редакторов пул потоков асинхронных источников"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="completion")
+    return _executor
+
+
+class CompletionProvider:
+    """Источник предложений автодополнения.
+
+    prepare вызывается в потоке Tk: смотрит на слово и состояние редактора
+    и возвращает индексы для поиска или None, если предложить нечего.
+    search ищет по ним и возвращает пары (слово, оценка). У асинхронных
+    источников search выполняется в пуле потоков, поэтому их индексы после
+    публикации не меняются. У каждого источника свой матчер - сужение
+    по прошлому запросу не сбивается соседями; учёт недавних слов общий.
+    """
+
+    asynchronous = False
+
+    def __init__(self, history):
+        self.matcher = FuzzyMatcher(history=history)
+
+    def prepare(self, autocomplete, word):
+        raise NotImplementedError
+
+    def search(self, indexes, word, nearby=()):
+        return self.matcher.search_scored(indexes, word, LIMIT, nearby)
+
+
+class StaticProvider(CompletionProvider):
+    """Встроенные имена, ключевые слова и базовые предложения"""
+
+    asynchronous = True
+
+    def __init__(self, history, static_index):
+        super().__init__(history)
+        self.static_index = static_index
+
+    def prepare(self, autocomplete, word):
+        return None if '.' in word else [self.static_index()]
+
+
+class BufferProvider(CompletionProvider):
+    """Имена текущего буфера. Индекс меняется с каждой правкой, поэтому
+    ищем сразу в потоке Tk - это укладывается в бюджет матчера"""
+
+    def prepare(self, autocomplete, word):
+        return None if '.' in word else [autocomplete.editor.symbol_index()]
+
+
+class ProjectProvider(CompletionProvider):
+    """Имена проекта, а после точки - имена модуля проекта"""
+
+    asynchronous = True
+
+    def prepare(self, autocomplete, word):
+        project = autocomplete.project_index
+        if not project:
+            return None
+        if '.' not in word:
+            return [project.names]
+        members = project.members(autocomplete.resolve_module(word))
+        return [members] if members is not None else None
+
+    def search(self, indexes, word, nearby=()):
+        if '.' not in word:
+            return super().search(indexes, word, nearby)
+        return _member_search(self.matcher, indexes, word)
+
+
+class ModuleMembersProvider(CompletionProvider):
+    """Имена установленных модулей после точки (os., np.linalg.)"""
+
+    asynchronous = True
+
+    def prepare(self, autocomplete, word):
+        members = autocomplete.module_members
+        project = autocomplete.project_index
+        if not members or '.' not in word:
+            return None
+        module = autocomplete.resolve_module(word)
+        if not autocomplete.editor.symbols.is_imported(word):
+            # self., x. - не модули, их не импортируем
+            return None
+        if project and project.members(module) is not None:
+            # Модуль проекта не импортируем - его имена даёт ProjectProvider
+            return None
+        index = members.members(module)
+        if index is None:
+            if members.is_pending(module):
+                autocomplete.waiting_module = module
+            return None
+        return [index]
+
+    def search(self, indexes, word, nearby=()):
+        return _member_search(self.matcher, indexes, word)
+
+
+def _member_search(matcher, indexes, word):
+    # Предложения после точки показываются целиком: module.name
+    module, _, attr = word.rpartition('.')
+    if not attr:
+        pairs = [(name, 0) for name in indexes[0].search('', LIMIT)]
+    else:
+        pairs = matcher.search_scored(indexes, attr, LIMIT)
+    return [(f"{module}.{name}", score) for name, score in pairs]
+
+
+class CompletionRequest:
+    """Один запрос дополнения: результаты источников сливаются по мере
+    прихода, отменённый запрос свои результаты не показывает"""
+
+    def __init__(self, word):
+        self.word = word
+        self.scores = {}  # слово -> лучшая оценка среди источников
+        self.pending = 0  # сколько асинхронных источников ещё не ответило
+        self.futures = []
+        self.shown = False  # список уже показывался по этому запросу
+        self.started = time.perf_counter()
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    @property
+    def done(self):
+        return not self.pending
+
+    def cancel(self):
+        self._cancelled.set()
+        for future in self.futures:
+            future.cancel()
+
+    def merge(self, pairs):
+        scores = self.scores
+        for word, score in pairs:
+            if scores.get(word, score - 1) < score:
+                scores[word] = score
+
+    def best(self, limit=LIMIT):
+        return [word for word, _ in nlargest(limit, self.scores.items(), key=rank)]
@@ -1,8 +1,16 @@
 import os
+import queue
 import tkinter as tk
 import customtkinter as ctk
 from tkinter import filedialog, messagebox
 from ui.theme import THEMES
+from ui.file_tree import DirectoryLoader, FileTree
+from ui.file_watcher import create_watcher
+
+ROW_HEIGHT = 26  # высота строки дерева вместе с промежутком
+WHEEL_ROWS = 3  # строк за один шаг колеса мыши
+WATCH_POLL_MS = 250  # как часто забираем изменения от наблюдателя за файлами
+LOAD_POLL_MS = 20  # как часто забираем порции фонового чтения папок
 
 class FilePanel:
     def __init__(self, parent, ide):
@@ -11,9 +19,15 @@ class FilePanel:
         self.current_font = getattr(ide, 'current_font', 'Consolas')
         self.current_size = getattr(ide, 'current_size', 12)
         self.file_panel_root = getattr(ide, 'last_directory', os.path.abspath(os.getcwd()))
-        self.file_tree_state = {}  # path: expanded True/False
-        self.file_tree_items = []  # flat list of (full_path, level, isdir, expanded)
+        self.tree = None  # FileTree папки file_panel_root
         self.file_panel_update_job = None
+        # Наблюдатель за раскрытыми папками; изменения применяются к дереву
+        # пачками в schedule_file_panel_update
+        self.watcher = create_watcher()
+        # Папки читаются в фоне и приходят порциями, см. _poll_loads
+        self.loader = DirectoryLoader()
+        self._load_poll_job = None
+        self._restore = set()  # папки, которые раскроются, когда прочитается их родитель
 
         # Основной фрейм панели
         self.frame = ctk.CTkFrame(parent, fg_color=THEMES[self.current_theme]["editor_bg"], width=150)
@@ -31,11 +45,19 @@ class FilePanel:
         self.choose_root_btn = ctk.CTkButton(self.toolbar, text="📂", width=24, height=24, command=self.choose_file_panel_folder, fg_color="transparent")
         self.choose_root_btn.pack(side="left", padx=1)
 
-        # Скроллируемый список файлов
-        self.scrollable = ctk.CTkScrollableFrame(self.frame, fg_color=THEMES[self.current_theme]["editor_bg"], width=150)
-        self.scrollable.pack(expand=True, fill="both", padx=1, pady=(0,2))
+        # Список файлов: кнопки создаются только для строк, которые видны,
+        # и при прокрутке переиспользуются для других строк
+        self.body = ctk.CTkFrame(self.frame, fg_color="transparent")
+        self.body.pack(expand=True, fill="both", padx=1, pady=(0,2))
+        self.scrollbar = ctk.CTkScrollbar(self.body, command=self._on_scrollbar)
+        self.scrollbar.pack(side="right", fill="y")
+        self.viewport = tk.Frame(self.body, bg=THEMES[self.current_theme]["editor_bg"], bd=0, highlightthickness=0)
+        self.viewport.pack(side="left", expand=True, fill="both")
+        self.viewport.bind("<Configure>", lambda e: self._render_rows())
+        self._bind_wheel(self.viewport)
 
-        self.file_widgets = []  # Для хранения ссылок на кнопки/лейблы файлов
+        self.rows = []  # пул кнопок строк; строка i стоит на i-м месте окна
+        self.first_row = 0  # индекс в tree.rows первой видимой строки
         self.file_panel_visible = True
         self.schedule_file_panel_update()
         self.populate_file_listbox_tree()
@@ -44,68 +66,225 @@ class FilePanel:
         self.populate_file_listbox_tree()
 
     def populate_file_listbox_tree(self):
-        # Очищаем старые виджеты
-        for w in self.file_widgets:
-            w.destroy()
-        self.file_widgets.clear()
-        self.file_tree_items.clear()
+        """Строит дерево папки заново; раскрытые папки остаются раскрытыми"""
+        expanded = set()
+        if self.tree and self.tree.root.path == self.file_panel_root:
+            expanded = {node.path for node in self.tree.nodes.values() if node.expanded and node is not self.tree.root}
+        # Чтение папок прежнего дерева больше не нужно
+        self.loader.cancel_all()
+        self.tree = FileTree(self.file_panel_root, lazy=True)
+        self._restore = expanded
+        self.loader.load(self.file_panel_root)
+        self._schedule_load_poll()
+        self._sync_watches()
+        self._render_rows()
+
+    def _expand(self, node):
+        if node.children is not None and not node.loading:
+            # Пока папка была свёрнута, за ней не следили - раскрываем с
+            # прежним содержимым и перечитываем её в фоне
+            self.loader.load(node.path, chunks=False)
+            self._schedule_load_poll()
+        if self.tree.expand(node, lazy=True):
+            self.loader.load(node.path)
+            self._schedule_load_poll()
 
-        def walk(path, level):
+    def _schedule_load_poll(self):
+        if self._load_poll_job is None:
+            self._load_poll_job = self.frame.after(LOAD_POLL_MS, self._poll_loads)
+
+    def _poll_loads(self):
+        """Добавляет в дерево пришедшие порции содержимого папок, а
+        перечитанные целиком папки сверяет с их новым содержимым"""
+        self._load_poll_job = None
+        arrived = False
+        while True:
             try:
-                entries = sorted(os.listdir(path), key=lambda x: (not os.path.isdir(os.path.join(path, x)), x.lower()))
-            except Exception:
-                return
-            for p in entries:
-                full_path = os.path.join(path, p)
-                isdir = os.path.isdir(full_path)
-                expanded = self.file_tree_state.get(full_path, False)
-                icon = "📁" if isdir else "📄"
-                prefix = "    " * level
-                display_text = f"{prefix}{icon} {p}"
-                btn = ctk.CTkButton(
-                    self.scrollable,
-                    text=display_text,
-                    anchor="w",
-                    width=130,
-                    height=24,
-                    fg_color=(THEMES[self.current_theme]["output_bg"] if expanded else "transparent") if isdir else "transparent",
-                    text_color=THEMES[self.current_theme]["editor_fg"],
-                    font=(self.current_font, self.current_size-1),
-                    command=lambda fp=full_path, d=isdir, e=expanded: self.on_file_click(fp, d, e, level)
-                )
-                btn.pack(fill="x", padx=1, pady=1)
-                btn.bind("<Button-3>", lambda event, fp=full_path, d=isdir: self._on_file_rmb(event, fp, d))
-                btn.bind("<Button-2>", lambda event, fp=full_path, d=isdir: self._on_file_rmb(event, fp, d))
-                self.file_widgets.append(btn)
-                self.file_tree_items.append((full_path, level, isdir, expanded))
-                if isdir and expanded:
-                    walk(full_path, level+1)
-        walk(self.file_panel_root, 0)
-
-    def on_file_click(self, path, isdir, expanded, level):
-        if isdir:
-            self.file_tree_state[path] = not expanded
-            self.populate_file_listbox_tree()
-        elif os.path.isfile(path):
-            self.ide.on_file_open(path)
+                path, cancelled, entries, done = self.loader.results.get_nowait()
+            except queue.Empty:
+                break
+            if cancelled.is_set():
+                continue
+            if done:
+                self.loader.finish(path, cancelled)
+            node = self.tree.get(path)
+            if node is None or not node.isdir or node.children is None:
+                continue
+            if not node.loading:
+                self.tree.refresh(node, entries)
+                arrived = True
+                continue
+            self.tree.add_entries(node, entries, done)
+            arrived = True
+            if done:
+                # Папки, раскрытые до пересборки дерева, раскрываются снова
+                for child in node.children:
+                    if child.path in self._restore:
+                        self._restore.discard(child.path)
+                        self._expand(child)
+        if arrived:
+            self._sync_watches()
+            self._render_rows()
+        if self.loader.pending:
+            self._schedule_load_poll()
+
+    def _sync_watches(self):
+        # Следим за раскрытыми папками (корень раскрыт всегда)
+        self.watcher.sync(node.path for node in self.tree.nodes.values() if node.isdir and node.expanded)
+
+    def _visible_rows(self):
+        """Сколько строк помещается в окне (последняя - частично)"""
+        return max(1, self.viewport.winfo_height() // ROW_HEIGHT + 1)
+
+    def _render_rows(self):
+        """Показывает строки дерева, попадающие в окно прокрутки"""
+        visible = self._visible_rows()
+        total = len(self.tree.rows) if self.tree else 0
+        self.first_row = max(0, min(self.first_row, total - visible + 1))
+        while len(self.rows) < visible:
+            self.rows.append(self._create_row(len(self.rows)))
+        for slot, row in enumerate(self.rows):
+            index = self.first_row + slot
+            if slot < visible and index < total:
+                self._configure_row(row, index)
+                if not row["placed"]:
+                    row["button"].place(x=0, y=slot * ROW_HEIGHT, relwidth=1)
+                    row["placed"] = True
+            elif row["placed"]:
+                row["button"].place_forget()
+                row["placed"] = False
+                row["index"] = None
+        if total:
+            self.scrollbar.set(self.first_row / total, min(1.0, (self.first_row + visible - 1) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def _create_row(self, slot):
+        row = {"button": None, "index": None, "state": None, "placed": False}
+        btn = ctk.CTkButton(
+            self.viewport,
+            text="",
+            anchor="w",
+            height=ROW_HEIGHT - 2,
+            command=lambda: self._on_row_click(row)
+        )
+        btn.bind("<Button-3>", lambda event: self._on_row_rmb(event, row))
+        btn.bind("<Button-2>", lambda event: self._on_row_rmb(event, row))
+        self._bind_wheel(btn)
+        row["button"] = btn
+        return row
+
+    def _configure_row(self, row, index):
+        node = self.tree.rows[index]
+        row["index"] = index
+        # Кнопка перенастраивается, только если в этом месте другая строка
+        state = (node, node.name, node.level, node.expanded, self.current_theme, self.current_font, self.current_size)
+        if state == row["state"]:
+            return
+        icon = "📁" if node.isdir else "📄"
+        prefix = "    " * node.level
+        text = f"{prefix}⏳ загрузка…" if node.placeholder else f"{prefix}{icon} {node.name}"
+        row["button"].configure(
+            text=text,
+            fg_color=THEMES[self.current_theme]["output_bg"] if node.isdir and node.expanded else "transparent",
+            text_color=THEMES[self.current_theme]["editor_fg"],
+            font=(self.current_font, self.current_size-1)
+        )
+        row["state"] = state
+
+    def _on_row_click(self, row):
+        if row["index"] is not None:
+            node = self.tree.rows[row["index"]]
+            if not node.placeholder:
+                self.on_file_click(node)
+
+    def _on_row_rmb(self, event, row):
+        if row["index"] is not None:
+            node = self.tree.rows[row["index"]]
+            if not node.placeholder:
+                self._on_file_rmb(event, node.path, node.isdir)
+
+    def scroll_to(self, first_row):
+        self.first_row = int(first_row)
+        self._render_rows()
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.scroll_to(float(amount) * len(self.tree.rows))
+        elif action == "scroll":
+            step = self._visible_rows() - 1 if unit == "pages" else 1
+            self.scroll_to(self.first_row + int(amount) * step)
+
+    def _bind_wheel(self, widget):
+        widget.bind("<MouseWheel>", self._on_mousewheel)
+        widget.bind("<Button-4>", lambda e: self.scroll_to(self.first_row - WHEEL_ROWS))
+        widget.bind("<Button-5>", lambda e: self.scroll_to(self.first_row + WHEEL_ROWS))
+
+    def _on_mousewheel(self, event):
+        self.scroll_to(self.first_row - WHEEL_ROWS * (1 if event.delta > 0 else -1))
+
+    def on_file_click(self, node):
+        if node.isdir:
+            # Меняются только строки поддерева этой папки
+            if node.expanded:
+                if node.loading:
+                    self.loader.cancel(node.path)
+                self.tree.collapse(node)
+            else:
+                self._expand(node)
+            self._sync_watches()
+            self._render_rows()
+        elif os.path.isfile(node.path):
+            self.ide.on_file_open(node.path)
 
     def schedule_file_panel_update(self):
         if self.file_panel_update_job:
             self.frame.after_cancel(self.file_panel_update_job)
-        self.file_panel_update_job = self.frame.after(15000, self.schedule_file_panel_update)
+        self.file_panel_update_job = self.frame.after(WATCH_POLL_MS, self._apply_file_changes)
+
+    def _apply_file_changes(self):
+        """Перечитывает в фоне папки, о которых сообщил наблюдатель"""
+        self.file_panel_update_job = None
+        changed = set()
+        while True:
+            try:
+                changed |= self.watcher.changes.get_nowait()
+            except queue.Empty:
+                break
+        if changed and self.tree:
+            for path in sorted(changed):
+                node = self.tree.get(path)
+                # Недочитанную папку дочитает уже идущее чтение
+                if node is not None and node.isdir and node.children is not None and not node.loading:
+                    self.loader.load(path, chunks=False)
+            # Дерево поправит _poll_loads, когда придёт содержимое
+            self._schedule_load_poll()
+        self.schedule_file_panel_update()
+
+    def destroy(self):
+        if self.file_panel_update_job:
+            self.frame.after_cancel(self.file_panel_update_job)
+            self.file_panel_update_job = None
+        if self._load_poll_job:
+            self.frame.after_cancel(self._load_poll_job)
+            self._load_poll_job = None
+        self.watcher.close()
+        self.loader.close()
 
     def update_theme(self, theme, font, size):
         self.current_theme = theme
         self.current_font = font
         self.current_size = size
         self.frame.configure(fg_color=THEMES[theme]["editor_bg"])
-        self.scrollable.configure(fg_color=THEMES[theme]["editor_bg"])
-        self.populate_file_listbox_tree()
+        self.viewport.configure(bg=THEMES[theme]["editor_bg"])
+        # Строки перенастроятся сами: тема входит в их состояние
+        self._render_rows()
 
     def choose_file_panel_folder(self):
         folder = filedialog.askdirectory()
         if folder:
             self.file_panel_root = folder
+            self.first_row = 0
             self.ide.last_directory = folder
             self.ide._save_settings()
             try:
@@ -114,6 +293,7 @@ class FilePanel:
                 pass
             self.populate_file_listbox_tree()
             self.schedule_file_panel_update()
+            self.ide._start_project_index()
 
     def _on_file_rmb(self, event, path, isdir):
         menu = tk.Menu(self.frame, tearoff=0)
@@ -146,7 +326,9 @@ class FilePanel:
             else:
                 with open(path, "w", encoding="utf-8") as f:
                     pass
-            self.populate_file_listbox_tree()
+            self.tree.add(path, is_folder)
+            self._sync_watches()
+            self._render_rows()
         except Exception as e:
             messagebox.showerror("Ошибка", str(e))
 
@@ -159,7 +341,19 @@ class FilePanel:
         new_path = os.path.join(os.path.dirname(path), new_name)
         try:
             os.rename(path, new_path)
-            self.populate_file_listbox_tree()
+            # Чтение недочитанных папок шло по старым путям
+            prefix = path + os.sep
+            loading = [node for node in self.tree.nodes.values()
+                       if node.loading and (node.path == path or node.path.startswith(prefix))]
+            for node in loading:
+                self.loader.cancel(node.path)
+            self.tree.rename(path, new_path)
+            for node in loading:
+                self.loader.load(node.path)
+            if loading:
+                self._schedule_load_poll()
+            self._sync_watches()
+            self._render_rows()
         except Exception as e:
             messagebox.showerror("Ошибка", str(e))
 
@@ -173,6 +367,8 @@ class FilePanel:
                 shutil.rmtree(path)
             else:
                 os.remove(path)
-            self.populate_file_listbox_tree()
+            self.tree.remove(path)
+            self._sync_watches()
+            self._render_rows()
         except Exception as e:
             messagebox.showerror("Ошибка", str(e)) 
\ No newline at end of file
@@ -0,0 +1,394 @@
+import os
+import queue
+import threading
+from bisect import insort
+from concurrent.futures import ThreadPoolExecutor
+
+# Столько элементов папки приходит из фонового чтения за одну порцию
+CHUNK_SIZE = 200
+
+
+def sort_key(node):
+    # Сначала папки, внутри - по имени без учёта регистра
+    return (not node.isdir, node.name.lower())
+
+
+class DirectoryCache:
+    """Содержимое папок, прочитанное через os.scandir.
+
+    Признак папки берётся из DirEntry, обычно без отдельного stat на каждый
+    элемент. Список хранится вместе с mtime папки: пока он не изменился,
+    повторное чтение стоит одного stat самой папки.
+    """
+
+    def __init__(self):
+        self.listings = {}  # путь -> (st_mtime_ns, [(имя, это_папка), ...])
+
+    def list(self, path):
+        """Пары (имя, это_папка) в порядке дерева; ошибка чтения - пустой список"""
+        mtime, entries = self.lookup(path)
+        if entries is not None:
+            return entries
+        try:
+            with os.scandir(path) as it:
+                entries = [(entry.name, _is_dir(entry)) for entry in it]
+        except OSError:
+            return []
+        return self.store(path, mtime, entries)
+
+    def lookup(self, path):
+        """(mtime папки, список из кэша или None, если папку надо читать)"""
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            self.listings.pop(path, None)
+            return None, []
+        cached = self.listings.get(path)
+        if cached and cached[0] == mtime:
+            return mtime, cached[1]
+        return mtime, None
+
+    def store(self, path, mtime, entries):
+        """Запоминает прочитанный при mtime список и возвращает его отсортированным"""
+        entries = sorted(entries, key=lambda item: (not item[1], item[0].lower()))
+        self.listings[path] = (mtime, entries)
+        return entries
+
+    def invalidate(self, path):
+        self.listings.pop(path, None)
+
+
+def _is_dir(entry):
+    try:
+        return entry.is_dir()
+    except OSError:
+        return False
+
+
+# Общий кэш: пересборка дерева не перечитывает неизменившиеся папки
+listings = DirectoryCache()
+
+
+class FileNode:
+    """Файл или папка дерева. children - None, пока папку не читали"""
+
+    __slots__ = ("path", "name", "isdir", "parent", "children", "expanded", "level", "loading")
+    placeholder = False
+
+    def __init__(self, path, isdir, parent=None):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.isdir = isdir
+        self.parent = parent
+        self.children = None
+        self.expanded = False
+        self.level = parent.level + 1 if parent else -1
+        self.loading = False  # содержимое ещё читается в фоне
+
+    def __lt__(self, other):
+        return sort_key(self) < sort_key(other)
+
+
+class Placeholder(FileNode):
+    """Строка «загрузка…» под папкой, которая ещё читается"""
+
+    __slots__ = ()
+    placeholder = True
+
+    def __init__(self, parent):
+        super().__init__(parent.path, False, parent)
+        self.name = ""
+
+
+class FileTree:
+    """Дерево файлов в памяти и плоский список его видимых строк.
+
+    Раскрытие папки вставляет в rows только её видимое поддерево, сворачивание
+    удаляет только его; создание, переименование и удаление правят один узел.
+    Папку можно раскрыть, не читая (lazy): до прихода содержимого через
+    add_entries под ней стоит строка-заглушка.
+    """
+
+    def __init__(self, root, cache=listings, lazy=False):
+        self.cache = cache
+        self.root = FileNode(root, True)
+        self.nodes = {root: self.root}  # путь -> узел для всех прочитанных узлов
+        self.rows = []  # видимые узлы по порядку, без корня
+        self._placeholders = {}  # читающаяся папка -> её заглушка
+        self.expand(self.root, lazy)
+
+    def load_children(self, node):
+        """Читает содержимое папки node; ошибка чтения - пустая папка"""
+        children = []
+        # Список из кэша уже отсортирован
+        for name, isdir in self.cache.list(node.path):
+            path = os.path.join(node.path, name)
+            child = FileNode(path, isdir, node)
+            children.append(child)
+            self.nodes[path] = child
+        node.children = children
+
+    def get(self, path):
+        return self.nodes.get(path)
+
+    def is_visible(self, node):
+        parent = node.parent
+        while parent is not None:
+            if not parent.expanded:
+                return False
+            parent = parent.parent
+        return True
+
+    def row_of(self, node):
+        """Номер строки узла в rows (узел должен быть виден)"""
+        return self.rows.index(node)
+
+    def visible_subtree(self, node):
+        """Видимые потомки раскрытой папки node в порядке строк"""
+        for child in node.children or ():
+            yield child
+            if child.expanded:
+                yield from self.visible_subtree(child)
+        if node.loading:
+            yield self._placeholders[node]
+
+    def expand(self, node, lazy=False):
+        """Раскрывает папку; lazy - не читать её, если она ещё не прочитана.
+        Возвращает True, если содержимое надо прочитать и передать в add_entries"""
+        if node.expanded or not node.isdir:
+            return False
+        started = False
+        if node.children is None:
+            if lazy:
+                node.children = []
+                node.loading = started = True
+                self._placeholders[node] = Placeholder(node)
+            else:
+                self.load_children(node)
+        node.expanded = True
+        if self.is_visible(node):
+            i = self.row_of(node) + 1 if node is not self.root else 0
+            self.rows[i:i] = list(self.visible_subtree(node))
+        return started
+
+    def collapse(self, node):
+        """Сворачивает папку. Недочитанная папка забывает прочитанное:
+        при следующем раскрытии она читается заново"""
+        if not node.expanded or node is self.root:
+            return
+        if self.is_visible(node):
+            i = self.row_of(node) + 1
+            count = sum(1 for _ in self.visible_subtree(node))
+            del self.rows[i:i + count]
+        node.expanded = False
+        if node.loading:
+            for child in node.children:
+                self._forget(child)
+            node.children = None
+            node.loading = False
+            del self._placeholders[node]
+
+    def add_entries(self, node, entries, done):
+        """Порция (имя, это_папка) фонового чтения папки node"""
+        if not node.loading:
+            return
+        visible = node.expanded and self.is_visible(node)
+        if visible:
+            i = self.row_of(node) + 1 if node is not self.root else 0
+            count = sum(1 for _ in self.visible_subtree(node))
+        new = []
+        for name, isdir in entries:
+            path = os.path.join(node.path, name)
+            if path not in self.nodes:
+                child = FileNode(path, isdir, node)
+                self.nodes[path] = child
+                new.append(child)
+        node.children = sorted(node.children + new, key=sort_key)
+        if done:
+            node.loading = False
+            del self._placeholders[node]
+        if visible:
+            self.rows[i:i + count] = list(self.visible_subtree(node))
+
+    def add(self, path, isdir, invalidate=True):
+        """Добавляет файл или папку path, если её папка уже прочитана.
+        invalidate=False - список папки в кэше уже содержит path (refresh)"""
+        parent = self.nodes.get(os.path.dirname(path))
+        if parent is None or parent.children is None or path in self.nodes:
+            return None
+        node = FileNode(path, isdir, parent)
+        self.nodes[path] = node
+        insort(parent.children, node)
+        if invalidate:
+            # mtime папки может не успеть смениться - старый список не годится
+            self.cache.invalidate(parent.path)
+        if parent.expanded and self.is_visible(parent):
+            self.rows.insert(self._insert_row(node), node)
+        return node
+
+    def remove(self, path, invalidate=True):
+        """Убирает узел path вместе с поддеревом"""
+        node = self.nodes.get(path)
+        if node is None or node is self.root:
+            return None
+        if self.is_visible(node):
+            i = self.row_of(node)
+            count = 1 + (sum(1 for _ in self.visible_subtree(node)) if node.expanded else 0)
+            del self.rows[i:i + count]
+        node.parent.children.remove(node)
+        self._forget(node)
+        if invalidate:
+            self.cache.invalidate(node.parent.path)
+        return node
+
+    def rename(self, path, new_path):
+        """Переименовывает узел в той же папке, сохраняя раскрытые папки внутри.
+        Недочитанные папки поддерева остаются недочитанными: их чтение надо
+        начать заново по новому пути"""
+        node = self.nodes.get(path)
+        if node is None or node is self.root:
+            return None
+        visible = self.is_visible(node)
+        block = [node]
+        if visible:
+            i = self.row_of(node)
+            if node.expanded:
+                block += list(self.visible_subtree(node))
+            del self.rows[i:i + len(block)]
+        node.parent.children.remove(node)
+        self._unpath(node)
+        node.name = os.path.basename(new_path)
+        self._repath(node, new_path)
+        insort(node.parent.children, node)
+        self.cache.invalidate(node.parent.path)
+        if visible:
+            i = self._insert_row(node)
+            self.rows[i:i] = block
+        return node
+
+    def refresh(self, node, entries=None):
+        """Сверяет папку node с её содержимым entries (по умолчанию читает его
+        через кэш): новые имена добавляются, пропавшие удаляются, у оставшихся
+        узлов сохраняется раскрытие"""
+        if node.children is None or node.loading:
+            return
+        if entries is None:
+            entries = self.cache.list(node.path)
+        entries = dict(entries)
+        old = {child.name: child for child in node.children}
+        for name, child in old.items():
+            # Файл, заменённый папкой с тем же именем, тоже пересоздаём
+            if entries.get(name) != child.isdir:
+                self.remove(child.path, invalidate=False)
+        for name, isdir in entries.items():
+            path = os.path.join(node.path, name)
+            if path not in self.nodes:
+                self.add(path, isdir, invalidate=False)
+
+    def _insert_row(self, node):
+        # Строка узла: перед следующим соседом, а если его нет - после
+        # всего видимого поддерева родителя
+        siblings = node.parent.children
+        k = siblings.index(node)
+        if k + 1 < len(siblings):
+            return self.row_of(siblings[k + 1])
+        parent = node.parent
+        row = 0 if parent is self.root else self.row_of(parent) + 1
+        for child in siblings:
+            if child is not node:
+                row += 1
+                if child.expanded:
+                    row += sum(1 for _ in self.visible_subtree(child))
+        return row
+
+    def _forget(self, node):
+        self.nodes.pop(node.path, None)
+        self._placeholders.pop(node, None)
+        for child in node.children or ():
+            self._forget(child)
+
+    def _unpath(self, node):
+        # В отличие от _forget заглушки недочитанных папок остаются
+        self.nodes.pop(node.path, None)
+        for child in node.children or ():
+            self._unpath(child)
+
+    def _repath(self, node, path):
+        node.path = path
+        self.nodes[path] = node
+        if node.loading:
+            self._placeholders[node].path = path
+        for child in node.children or ():
+            self._repath(child, os.path.join(path, child.name))
+
+
+class DirectoryLoader:
+    """Чтение папок в пуле потоков.
+
+    Содержимое приходит в очередь results порциями (путь, отмена, пары,
+    последняя ли порция); неизменённая папка - одной порцией из кэша.
+    Перечитывание уже показанной папки (chunks=False) тоже приходит одной
+    порцией: дерево сверяется с её полным содержимым.
+    Отменённое чтение прекращается, а уже отправленные порции с
+    установленным флагом отмены получатель пропускает.
+    """
+
+    def __init__(self, cache=listings, chunk_size=CHUNK_SIZE):
+        self.cache = cache
+        self.chunk_size = chunk_size
+        self.results = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="dirload")
+        self._loads = {}  # путь -> threading.Event отмены текущего чтения
+
+    @property
+    def pending(self):
+        return bool(self._loads)
+
+    def load(self, path, chunks=True):
+        self.cancel(path)
+        cancelled = self._loads[path] = threading.Event()
+        self._executor.submit(self._read, path, cancelled, chunks)
+
+    def cancel(self, path):
+        cancelled = self._loads.pop(path, None)
+        if cancelled is not None:
+            cancelled.set()
+
+    def cancel_all(self):
+        for path in list(self._loads):
+            self.cancel(path)
+
+    def finish(self, path, cancelled):
+        """Получатель принял последнюю порцию"""
+        if self._loads.get(path) is cancelled:
+            del self._loads[path]
+
+    def close(self):
+        self.cancel_all()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _read(self, path, cancelled, chunks):
+        if cancelled.is_set():
+            return
+        mtime, cached = self.cache.lookup(path)
+        if cached is not None:
+            self.results.put((path, cancelled, cached, True))
+            return
+        entries = []
+        chunk = []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    if cancelled.is_set():
+                        return
+                    chunk.append((entry.name, _is_dir(entry)))
+                    if chunks and len(chunk) >= self.chunk_size:
+                        self.results.put((path, cancelled, chunk, False))
+                        entries += chunk
+                        chunk = []
+        except OSError:
+            pass
+        entries += chunk
+        if mtime is not None:
+            self.cache.store(path, mtime, entries)
+        self.results.put((path, cancelled, chunk, True))
@@ -0,0 +1,222 @@
+import ctypes
+import ctypes.util
+import os
+import queue
+import select
+import struct
+import sys
+import threading
+import time
+
+# Пачка изменений уходит, когда события стихли на COALESCE_DELAY секунд,
+# но не позже MAX_DELAY после первого события (git checkout и т.п.)
+COALESCE_DELAY = 0.2
+MAX_DELAY = 1.0
+# Как часто опрашивающий наблюдатель проверяет mtime папок
+POLL_INTERVAL = 1.0
+
+# Константы inotify из <sys/inotify.h>
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_WATCH_MASK = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+class FileWatcher:
+    """Наблюдатель за папками: в фоновом потоке собирает изменившиеся папки,
+    склеивает всплески событий и кладёт пачки (frozenset путей) в changes.
+
+    Поток Tk забирает пачки из очереди сам; наблюдатель к Tk не обращается.
+    """
+
+    def __init__(self):
+        self.changes = queue.Queue()
+        self.paths = set()  # папки, за которыми следим
+        self._lock = threading.Lock()
+        self._changed = set()
+        self._first = self._last = None  # время первого и последнего события пачки
+        self._closed = False
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def close(self):
+        self._closed = True
+
+    def sync(self, paths):
+        """Следит ровно за папками paths"""
+        paths = set(paths)
+        with self._lock:
+            added = paths - self.paths
+            removed = self.paths - paths
+            self.paths = paths
+        for path in removed:
+            self._remove(path)
+        for path in added:
+            self._add(path)
+
+    def _add(self, path):
+        pass
+
+    def _remove(self, path):
+        pass
+
+    def _wait(self, timeout):
+        """Ждёт событий не дольше timeout и отмечает изменившиеся папки"""
+        raise NotImplementedError
+
+    def _note(self, path):
+        now = time.monotonic()
+        if not self._changed:
+            self._first = now
+        self._last = now
+        self._changed.add(path)
+
+    def _run(self):
+        try:
+            while not self._closed:
+                self._wait(COALESCE_DELAY / 2)
+                if not self._changed:
+                    continue
+                now = time.monotonic()
+                if now - self._last >= COALESCE_DELAY or now - self._first >= MAX_DELAY:
+                    self.changes.put(frozenset(self._changed))
+                    self._changed = set()
+        except Exception as e:
+            print(f"Ошибка наблюдения за файлами: {e}")
+        finally:
+            self._shutdown()
+
+    def _shutdown(self):
+        pass
+
+
+class InotifyWatcher(FileWatcher):
+    """Наблюдатель на inotify (Linux) через ctypes"""
+
+    def __init__(self):
+        super().__init__()
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._libc = libc
+        self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        self._wds = {}  # дескриптор наблюдения -> путь
+        self._by_path = {}  # путь -> дескриптор наблюдения
+
+    def _add(self, path):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), _WATCH_MASK)
+        if wd >= 0:
+            with self._lock:
+                self._wds[wd] = path
+                self._by_path[path] = wd
+
+    def _remove(self, path):
+        with self._lock:
+            wd = self._by_path.pop(path, None)
+            self._wds.pop(wd, None)
+        if wd is not None:
+            self._libc.inotify_rm_watch(self._fd, wd)
+
+    def _wait(self, timeout):
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset + _EVENT.size <= len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size + length
+            if mask & IN_Q_OVERFLOW:
+                # События потеряны - перечитываем всё, за чем следим
+                with self._lock:
+                    paths = list(self.paths)
+                for path in paths:
+                    self._note(path)
+                continue
+            with self._lock:
+                path = self._wds.get(wd)
+                if mask & IN_IGNORED:
+                    self._wds.pop(wd, None)
+                    if path is not None and self._by_path.get(path) == wd:
+                        del self._by_path[path]
+            if path is None:
+                continue
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                # Папка сама исчезла - меняется её родитель
+                self._note(os.path.dirname(path))
+            elif not mask & IN_IGNORED:
+                self._note(path)
+
+    def _shutdown(self):
+        os.close(self._fd)
+
+
+class PollingWatcher(FileWatcher):
+    """Запасной наблюдатель: раз в POLL_INTERVAL сравнивает mtime папок.
+    Следит только за раскрытыми папками - их сюда и передают"""
+
+    def __init__(self, interval=POLL_INTERVAL):
+        super().__init__()
+        self.interval = interval
+        self._mtimes = {}
+        self._next_poll = 0
+
+    def _add(self, path):
+        self._mtimes[path] = _mtime(path)
+
+    def _remove(self, path):
+        self._mtimes.pop(path, None)
+
+    def _wait(self, timeout):
+        time.sleep(timeout)
+        now = time.monotonic()
+        if now < self._next_poll:
+            return
+        self._next_poll = now + self.interval
+        with self._lock:
+            paths = list(self.paths)
+        for path in paths:
+            mtime = _mtime(path)
+            old = self._mtimes.get(path, mtime)
+            if mtime != old:
+                self._mtimes[path] = mtime
+                # Пропавшая папка меняет и родителя
+                self._note(path if mtime is not None else os.path.dirname(path))
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def create_watcher():
+    """inotify на Linux, иначе (или если он недоступен) - опрос mtime"""
+    if sys.platform.startswith("linux"):
+        try:
+            watcher = InotifyWatcher()
+        except (OSError, AttributeError) as e:
+            print(f"Ошибка запуска inotify, используется опрос: {e}")
+        else:
+            watcher.start()
+            return watcher
+    watcher = PollingWatcher()
+    watcher.start()
+    return watcher
@@ -0,0 +1,428 @@
+import queue
+import threading
+from itertools import islice
+from pygments.lexer import RegexLexer
+from pygments.token import Token, Error, Whitespace, _TokenType
+
+ROOT_STATE = ('root',)
+
+# Десятки типов токенов Pygments сводятся к нескольким классам стиля, по
+# одному тегу Tk на класс. Подтипы берут класс ближайшего родителя; токены
+# без класса (имена, пробелы) рисуются цветом текста и тегов не получают
+STYLE_CLASSES = {
+    Token.Keyword: 'keyword',
+    Token.Name.Exception: 'keyword',
+    Token.Name.Label: 'keyword',
+    Token.Name.Entity: 'keyword',
+    Token.Generic.Heading: 'keyword',
+    Token.Name.Builtin: 'builtin',
+    Token.Name.Class: 'builtin',
+    Token.Name.Function: 'function',
+    Token.Name.Decorator: 'function',
+    Token.Name.Attribute: 'attribute',
+    Token.Literal: 'string',
+    Token.Literal.Number: 'number',
+    Token.Comment: 'comment',
+    Token.Generic.Inserted: 'comment',
+    Token.Operator: 'operator',
+    Token.Punctuation: 'operator',
+    Token.Error: 'error',
+    Token.Generic.Deleted: 'error',
+    Token.Generic.Error: 'error',
+}
+STYLE_TAGS = sorted(set(STYLE_CLASSES.values()))
+
+_style_cache = {}
+
+# Лексеры общие на весь процесс: создаются при первом запросе расширения,
+# а модули лексеров Pygments импортируются только тогда же
+_EXTENSION_LEXERS = {
+    '.py': 'python', '.pyw': 'python',
+    '.js': 'javascript', '.javascript': 'javascript',
+    '.html': 'html', '.htm': 'html',
+    '.css': 'css',
+    '.json': 'json',
+    '.xml': 'xml',
+    '.sql': 'sql',
+    '.md': 'markdown', '.markdown': 'markdown',
+    '.txt': 'text', '.text': 'text',
+}
+_lexer_cache = {}
+
+# Лексеры, у которых многострочные конструкции (строки в тройных кавычках и т.п.)
+# выражены состояниями, а не одним регулярным выражением на несколько строк.
+# Только их можно продолжать с середины текста: у остальных (например,
+# /* ... */ в JavaScript и CSS) правка ниже может поменять токены выше.
+_CHECKPOINT_LEXERS = {'PythonLexer', 'Python2Lexer'}
+
+
+def _tokenize(lexer, text, stack=ROOT_STATE):
+    """Повторяет цикл RegexLexer.get_tokens_unprocessed, но дополнительно
+    сообщает стек состояний лексера в начале каждой строки.
+
+    Выдаёт (pos, token, value) для токенов и (pos, None, state) сразу после
+    совпадения, закончившегося на границе строки.
+    """
+    pos = 0
+    tokendefs = lexer._tokens
+    statestack = list(stack)
+    statetokens = tokendefs[statestack[-1]]
+    while 1:
+        for rexmatch, action, new_state in statetokens:
+            m = rexmatch(text, pos)
+            if m:
+                if action is not None:
+                    if type(action) is _TokenType:
+                        yield pos, action, m.group()
+                    else:
+                        yield from action(lexer, m)
+                pos = m.end()
+                if new_state is not None:
+                    if isinstance(new_state, tuple):
+                        for state in new_state:
+                            if state == '#pop':
+                                if len(statestack) > 1:
+                                    statestack.pop()
+                            elif state == '#push':
+                                statestack.append(statestack[-1])
+                            else:
+                                statestack.append(state)
+                    elif isinstance(new_state, int):
+                        if abs(new_state) >= len(statestack):
+                            del statestack[1:]
+                        else:
+                            del statestack[new_state:]
+                    elif new_state == '#push':
+                        statestack.append(statestack[-1])
+                    statetokens = tokendefs[statestack[-1]]
+                if pos and text[pos - 1] == '\n':
+                    yield pos, None, tuple(statestack)
+                break
+        else:
+            try:
+                if text[pos] == '\n':
+                    # В конце строки лексер сбрасывается в "root"
+                    statestack = ['root']
+                    statetokens = tokendefs['root']
+                    yield pos, Whitespace, '\n'
+                    pos += 1
+                    yield pos, None, ROOT_STATE
+                    continue
+                yield pos, Error, text[pos]
+                pos += 1
+            except IndexError:
+                break
+
+
+def style_for(ttype):
+    """Класс стиля (имя тега) для типа токена или None"""
+    try:
+        return _style_cache[ttype]
+    except KeyError:
+        pass
+    parent = ttype
+    while parent is not None and parent not in STYLE_CLASSES:
+        parent = parent.parent
+    style = _style_cache[ttype] = STYLE_CLASSES.get(parent)
+    return style
+
+
+def lexer_for_extension(extension):
+    """Лексер для расширения файла; без расширения - Python"""
+    key = extension.lower() if extension else '.py'
+    lexer = _lexer_cache.get(key)
+    if lexer is None:
+        from pygments.lexers import get_lexer_by_name
+        try:
+            # Неизвестное расширение пробуем как имя лексера
+            lexer = get_lexer_by_name(_EXTENSION_LEXERS.get(key, key[1:]))
+        except Exception:
+            # Если не удалось определить, используем текстовый лексер
+            lexer = get_lexer_by_name('text')
+        _lexer_cache[key] = lexer
+    return lexer
+
+
+def supports_checkpoints(lexer):
+    """Можно ли продолжать лексирование этого лексера с середины текста"""
+    return (isinstance(lexer, RegexLexer)
+            and type(lexer).__name__ in _CHECKPOINT_LEXERS
+            and type(lexer).get_tokens_unprocessed is RegexLexer.get_tokens_unprocessed)
+
+
+def iter_lines(lexer, text, stack=ROOT_STATE):
+    """Лексирует text и выдаёт для каждой строки пару (runs, state).
+
+    runs - список (начальная колонка, конечная колонка, класс стиля),
+    state - стек состояний лексера в начале следующей строки или None,
+    если следующая строка начинается внутри многострочного токена.
+    Как и в Tk, последняя строка считается завершённой переводом строки.
+    """
+    text += '\n'
+    if supports_checkpoints(lexer):
+        tokens = _tokenize(lexer, text, stack)
+    else:
+        tokens = lexer.get_tokens_unprocessed(text)
+    runs = []
+    pending = None  # законченная строка, ждущая состояния следующей
+    line_start = 0
+    cursor = 0
+    find = text.find
+    for pos, ttype, value in tokens:
+        if ttype is None:
+            if pending is not None and pos == line_start:
+                yield pending, value
+                pending = None
+            continue
+        if not value or pos < cursor:
+            continue
+        end = pos + len(value)
+        if pos > cursor:
+            # Промежуток без токена (например, пропущенная группа bygroups)
+            # тоже может содержать переводы строк
+            nl = find('\n', cursor, pos)
+            while nl >= 0:
+                if pending is not None:
+                    yield pending, None
+                pending = runs
+                runs = []
+                line_start = nl + 1
+                nl = find('\n', line_start, pos)
+        cursor = end
+        tag = style_for(ttype)
+        nl = find('\n', pos, end)
+        if nl < 0:
+            if tag is not None:
+                runs.append((pos - line_start, end - line_start, tag))
+            continue
+        while nl >= 0:
+            if nl > pos and tag is not None:
+                runs.append((pos - line_start, nl - line_start, tag))
+            if pending is not None:
+                yield pending, None
+            pending = runs
+            runs = []
+            line_start = pos = nl + 1
+            nl = find('\n', pos, end)
+        if end > pos and tag is not None:
+            runs.append((pos - line_start, end - line_start, tag))
+    if pending is not None:
+        yield pending, None
+
+
+class IncrementalHighlighter:
+    """Хранит токены и состояния лексера по строкам и перелексирует только
+    изменённый участок буфера, пока поток токенов не совпадёт с прежним.
+
+    Строки нумеруются с нуля.
+    """
+
+    def __init__(self, lexer=None, line_count=1):
+        self.lexer = lexer
+        self.reset(line_count)
+
+    def reset(self, line_count):
+        """Помечает весь буфер как неподсвеченный"""
+        line_count = max(1, line_count)
+        self.states = [ROOT_STATE] + [None] * (line_count - 1)
+        self.runs = [None] * line_count
+        self.dirty_lo = 0
+        self.dirty_hi = line_count - 1
+        self.pass_line = None
+
+    def set_lexer(self, lexer):
+        self.lexer = lexer
+        self.reset(len(self.states))
+
+    @property
+    def line_count(self):
+        return len(self.states)
+
+    @property
+    def is_dirty(self):
+        return self.dirty_lo is not None
+
+    def splice(self, first, old_last, new_last):
+        """Строки first..old_last заменены строками first..new_last"""
+        if new_last < first:
+            # Правка не может оставить меньше одной строки: такой участок
+            # занижен на склеенные строки - расширяем его, иначе states и runs
+            # разойдутся по длине
+            old_last += first - new_last
+            new_last = first
+        delta = new_last - old_last
+        # Начатый проход лексировал старый текст
+        self.pass_line = None
+        self.states[first + 1:old_last + 1] = [None] * (new_last - first)
+        self.runs[first:old_last + 1] = [None] * (new_last - first + 1)
+        if self.dirty_lo is None:
+            self.dirty_lo, self.dirty_hi = first, new_last
+            return
+        hi = self.dirty_hi
+        if hi > old_last:
+            hi += delta
+        elif hi > first:
+            hi = first
+        lo = self.dirty_lo
+        if lo > old_last:
+            lo += delta
+        elif lo > first:
+            lo = first
+        self.dirty_lo = min(lo, first)
+        self.dirty_hi = max(hi, new_last)
+
+    def start_line(self):
+        """Ближайшая к грязному участку строка с известным состоянием лексера"""
+        line = self.dirty_lo
+        while self.states[line] is None:
+            line -= 1
+        return line
+
+    def begin(self, first):
+        """Начинает последовательный проход со строки first.
+
+        Возвращает стек состояний лексера, с которого надо лексировать.
+        """
+        self.pass_line = first
+        return self.states[first]
+
+    def step(self, runs, state):
+        """Принимает токены очередной строки прохода и состояние лексера
+        в начале следующей.
+
+        Возвращает runs, если токены строки изменились, иначе None. Когда
+        состояние за грязным участком совпало с прежним или буфер кончился,
+        проход завершается: pass_line становится None.
+        """
+        line = self.pass_line
+        changed = None
+        if runs != self.runs[line]:
+            self.runs[line] = changed = runs
+        line += 1
+        if line >= len(self.states) or (
+                line > self.dirty_hi and state is not None and state == self.states[line]):
+            self.pass_line = self.dirty_lo = self.dirty_hi = None
+            return changed
+        self.states[line] = state
+        if line > self.dirty_lo:
+            self.dirty_lo = line
+        if line > self.dirty_hi:
+            # Проход вышел за грязный участок, но токены этой строки ещё
+            # не пересчитаны: если проход прервут, продолжать надо отсюда
+            self.dirty_hi = line
+        self.pass_line = line
+        return changed
+
+    def relex(self, text, first):
+        """Перелексирует text (буфер начиная со строки first) в текущем потоке.
+
+        Генератор: для каждой обработанной строки выдаёт (номер строки, runs),
+        где runs равен None, если токены строки не изменились.
+        """
+        stack = self.begin(first)
+        for runs, state in iter_lines(self.lexer, text, stack):
+            line = self.pass_line
+            yield line, self.step(runs, state)
+            if self.pass_line is None:
+                return
+
+    def preview(self, first, lines):
+        """Применяет предварительно пролексированный участок (обычно видимую
+        область), не дожидаясь последовательного прохода.
+
+        lines - результат iter_lines для участка, начиная со строки first.
+        Состояние лексера в начале участка было взято из прошлого прохода,
+        поэтому результат приблизительный: последовательный проход потом
+        перекрасит только строки, где он ошибся. Состояния строк не меняются,
+        строки вне грязного участка не трогаются: последовательный проход
+        считает их токены верными. Выдаёт (номер строки, runs) изменившихся строк.
+        """
+        line = first
+        for runs, state in lines:
+            if self.dirty_lo is None or line > self.dirty_hi:
+                break
+            if line >= self.dirty_lo and runs != self.runs[line]:
+                self.runs[line] = runs
+                yield line, runs
+            line += 1
+
+
+class LexWorker:
+    """Фоновый поток, лексирующий снимки текста.
+
+    Задания помечаются версией буфера; результаты порциями по chunk_lines
+    строк кладутся в очередь results как (вид, версия, первая строка,
+    [(runs, state), ...], последняя ли порция). Предпросмотр видимой области
+    выполняется раньше последовательного прохода. Последовательный проход
+    не уходит вперёд больше чем на max_ahead непрочитанных порций.
+    """
+
+    def __init__(self, chunk_lines=200, max_ahead=4):
+        self.chunk_lines = chunk_lines
+        self.max_ahead = max_ahead
+        self.results = queue.Queue()
+        self._cond = threading.Condition()
+        self._preview = None
+        self._relex = None
+        self._ahead = 0
+        self._thread = None
+        self._closed = False
+
+    def submit_relex(self, version, lexer, text, first, stack):
+        with self._cond:
+            self._relex = (version, first, iter_lines(lexer, text, stack))
+            self._ahead = 0
+            self._wake()
+
+    def submit_preview(self, version, lexer, text, first, stack):
+        with self._cond:
+            self._preview = (version, first, lexer, text, stack)
+            self._wake()
+
+    def cancel(self):
+        with self._cond:
+            self._relex = None
+            self._preview = None
+
+    def consumed(self):
+        """Главный поток забрал порцию последовательного прохода"""
+        with self._cond:
+            self._ahead = max(0, self._ahead - 1)
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+    def _wake(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed and self._preview is None and (
+                        self._relex is None or self._ahead >= self.max_ahead):
+                    self._cond.wait()
+                if self._closed:
+                    return
+                preview, self._preview = self._preview, None
+                job = self._relex
+            if preview is not None:
+                version, first, lexer, text, stack = preview
+                lines = list(iter_lines(lexer, text, stack))
+                self.results.put(('preview', version, first, lines, True))
+                continue
+            version, first, lines_iter = job
+            chunk = list(islice(lines_iter, self.chunk_lines))
+            done = len(chunk) < self.chunk_lines
+            with self._cond:
+                if self._relex is not job:
+                    # Задание отменили или заменили, пока мы лексировали
+                    continue
+                self._relex = None if done else (version, first + len(chunk), lines_iter)
+                self._ahead += 1
+            self.results.put(('relex', version, first, chunk, done))
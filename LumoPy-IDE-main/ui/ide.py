@@ -13,10 +13,15 @@ from tkinter import ttk
 from ui.localization import LANGS, tr
 import json
 from ui.file_panel import FilePanel
+from ui.tab_bar import TabBar
+from ui.project_index import ProjectIndex
+from ui.module_members import ModuleMembers, resolve_interpreter
+from ui.latency import stats as latency_stats
 
 class IDE(ctk.CTk):
     FONTS = ["Consolas", "Fira Code", "Courier New"]
     SIZES = [10, 12, 14, 16, 18]
+    MAX_OPEN_EDITORS = 8
     SETTINGS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "settings.json")
 
     def __init__(self):
@@ -100,33 +105,29 @@ class IDE(ctk.CTk):
         self.main_frame.grid_rowconfigure(1, weight=0)
         self.main_frame.grid_columnconfigure(0, weight=1)
         # --- Вкладки ---
-        self.tabs = []  # [{'path': ..., 'name': ..., 'content': ..., 'dirty': ...}]
+        # [{'path': ..., 'name': ..., 'dirty': ..., 'editor': ...}]; у вкладки без
+        # редактора (ещё не открытой или выгруженной) вместо него 'content'
+        self.tabs = []
         self.active_tab = None
-        self.tab_frame = tk.Frame(self.main_frame, bg=THEMES[self.current_theme]["editor_bg"], height=28)
+        self.tab_bar = TabBar(self.main_frame, self)
+        self.tab_frame = self.tab_bar.frame
         self.tab_frame.pack(side="top", fill="x")
-        self.tab_buttons = {}
         self._render_tabs()
         self.inner_paned = ttk.PanedWindow(self.main_frame, orient="vertical")
         self.inner_paned.pack(expand=True, fill="both")
-        self.editor = CodeEditor(self.inner_paned)
-        self.inner_paned.add(self.editor, weight=3)
-        self.editor.scrollbar.master = self.editor
-        self.editor.bind('<Key>', self._on_editor_key)
+        # У каждой вкладки свой редактор: отмена, прокрутка и курсор живут
+        # в нём. Редакторы давно не открывавшихся вкладок выгружаются
+        self.editor_frame = tk.Frame(self.inner_paned)
+        self.inner_paned.add(self.editor_frame, weight=3)
+        self._editor_lru = []  # вкладки с редактором, последняя - активная
+        self.project_index = None
+        self.module_members = None
+        self.editor = self._create_editor()
+        self.editor.pack(expand=True, fill="both")
         
         # Устанавливаем расширение файла по умолчанию для подсветки синтаксиса
         self.editor.set_file_extension('.py')
         
-        # Привязываем горячие клавиши для автодополнения
-        self.editor.bind('<Control-space>', self.editor._trigger_autocomplete)
-        self.editor.bind('<Escape>', self.editor._hide_autocomplete)
-        
-        # Привязываем автопарные скобки
-        self.editor.bind('(', lambda e: self.editor._auto_pair('(', ')'))
-        self.editor.bind('[', lambda e: self.editor._auto_pair('[', ']'))
-        self.editor.bind('{', lambda e: self.editor._auto_pair('{', '}'))
-        self.editor.bind('"', lambda e: self.editor._auto_pair('"', '"'))
-        self.editor.bind("'", lambda e: self.editor._auto_pair("'", "'"))
-        
         # Привязываем горячие клавиши для работы с файлами
         self.bind('<Control-o>', lambda e: self.open_file())
         self.bind('<Control-s>', lambda e: self.save_file())
@@ -160,6 +161,8 @@ class IDE(ctk.CTk):
         self._load_project_config()
         # Только теперь применяем тему
         self.apply_theme()
+        # Индекс имён проекта строится в фоне, когда окно уже показано
+        self.after_idle(self._start_project_index)
 
     def update_file_panel_theme(self):
         self.recreate_file_listbox_with_theme()
@@ -173,12 +176,71 @@ class IDE(ctk.CTk):
         self.paned_window.configure(style="CustomSash.TPanedwindow")
         self.inner_paned.configure(style="CustomSash.TPanedwindow")
 
+    def _create_editor(self):
+        """Создаёт редактор вкладки с привязками IDE и текущей темой"""
+        editor = CodeEditor(self.editor_frame)
+        editor.scrollbar.master = editor
+        editor.bind('<Key>', self._on_editor_key)
+        editor.bind('<<DirtyChanged>>', self._on_dirty_changed)
+        
+        # Привязываем горячие клавиши для автодополнения
+        editor.bind('<Control-space>', editor._trigger_autocomplete)
+        editor.bind('<Escape>', editor._hide_autocomplete)
+        
+        # Привязываем автопарные скобки
+        editor.bind('(', lambda e: editor._auto_pair('(', ')'))
+        editor.bind('[', lambda e: editor._auto_pair('[', ']'))
+        editor.bind('{', lambda e: editor._auto_pair('{', '}'))
+        editor.bind('"', lambda e: editor._auto_pair('"', '"'))
+        editor.bind("'", lambda e: editor._auto_pair("'", "'"))
+        editor.autocomplete.project_index = self.project_index
+        editor.autocomplete.module_members = self.module_members
+        self._apply_editor_theme(editor)
+        return editor
+
+    def _start_project_index(self):
+        """(Пере)запускает фоновую индексацию папки проекта"""
+        if self.project_index:
+            self.project_index.close()
+        self.project_index = ProjectIndex(self.file_panel.file_panel_root)
+        self.project_index.start()
+        for editor in self._open_editors():
+            editor.autocomplete.project_index = self.project_index
+        self._update_module_members()
+
+    def _update_module_members(self):
+        """Берёт имена модулей у интерпретатора из настроек запуска проекта"""
+        interpreter = resolve_interpreter(getattr(self, 'run_config', {}).get("command"))
+        root = self.file_panel.file_panel_root
+        members = self.module_members
+        if members and members.interpreter == interpreter and members.cwd == root:
+            return
+        if members:
+            members.close()
+        self.module_members = ModuleMembers(interpreter, cwd=root)
+        # Встроенные функции нужны подсказкам сразу - собираем заранее
+        self.module_members.members("builtins")
+        for editor in self._open_editors():
+            editor.autocomplete.module_members = self.module_members
+
+    def _apply_editor_theme(self, editor):
+        theme = THEMES[self.current_theme]
+        editor.config(bg=theme["editor_bg"], fg=theme["editor_fg"], insertbackground=theme["editor_fg"], font=(self.current_font, self.current_size))
+        editor.set_syntax_theme(self.current_theme)
+
+    def _open_editors(self):
+        editors = [tab["editor"] for tab in self._editor_lru]
+        if self.editor not in editors:
+            editors.append(self.editor)
+        return editors
+
     def apply_theme(self):
         theme = THEMES[self.current_theme]
-        self.editor.config(bg=theme["editor_bg"], fg=theme["editor_fg"], insertbackground=theme["editor_fg"], font=(self.current_font, self.current_size))
+        for editor in self._open_editors():
+            self._apply_editor_theme(editor)
+            editor.force_highlight()
         if hasattr(self, 'terminal') and self.terminal:
             self.terminal.set_theme(theme["output_bg"], theme["output_fg"])
-        self.editor.force_highlight()
         for btn in [self.file_menu_btn, self.settings_menu_btn]:
             btn.configure(
                 hover_color=menu_hover_colors[self.current_theme],
@@ -189,6 +251,7 @@ class IDE(ctk.CTk):
         self.menu_frame.update_idletasks()
         self.file_panel.update_theme(self.current_theme, self.current_font, self.current_size)
         self.update_sash_color()
+        self.tab_bar.set_theme(self.current_theme)
         self._render_tabs()
         self._save_settings()
 
@@ -314,12 +377,22 @@ class IDE(ctk.CTk):
             self._render_tabs()
         with open(file_path, "w", encoding="utf-8") as f:
             f.write(self.editor.get("1.0", tk.END))
+        self.editor.mark_saved()
         self.active_tab["dirty"] = False
         self._render_tabs()
+        # Имена сохранённого модуля сразу попадают в дополнения проекта
+        if self.project_index:
+            self.project_index.update_file(file_path)
 
     def destroy(self):
         if hasattr(self, 'file_panel') and hasattr(self.file_panel, 'destroy'):
             self.file_panel.destroy()
+        if getattr(self, 'project_index', None):
+            self.project_index.close()
+        if getattr(self, 'module_members', None):
+            self.module_members.close()
+        # Замеры автодополнения - в файл из LUMOPY_LATENCY_LOG, если он задан
+        latency_stats.dump()
         super().destroy()
 
     def set_treeview_black(self):
@@ -396,17 +469,25 @@ class IDE(ctk.CTk):
             
         # Если нет активной вкладки, создаем новую "Безымянный"
         if not self.active_tab:
-            untitled_tab = {"path": None, "name": tr(self.current_lang, 'Untitled'), "content": "", "dirty": False}
+            # Свободный редактор становится редактором новой вкладки
+            untitled_tab = {"path": None, "name": tr(self.current_lang, 'Untitled'), "dirty": False, "editor": self.editor}
             self.tabs.append(untitled_tab)
             self.active_tab = untitled_tab
+            self._touch_editor(untitled_tab)
             # Устанавливаем расширение файла для подсветки синтаксиса
             self.editor.set_file_extension('.py')
             self._render_tabs()
-        else:
-            # Помечаем как грязную только если содержимое действительно изменилось
-            if self.editor.edit_modified():
-                self.active_tab["dirty"] = True
-                self._render_tabs()
+        # Признак изменения вкладки обновляет _on_dirty_changed
+
+    def _on_dirty_changed(self, event=None):
+        """Документ перешёл из сохранённого состояния в изменённое или обратно"""
+        for tab in self.tabs:
+            if tab.get("editor") is event.widget:
+                dirty = event.widget.is_modified()
+                if tab["dirty"] != dirty:
+                    tab["dirty"] = dirty
+                    self._render_tabs()
+                return
 
     def _on_file_listbox_rmb(self, event):
         # Проверяем, что клик был по file_listbox
@@ -527,38 +608,57 @@ class IDE(ctk.CTk):
             pass 
 
     def _render_tabs(self):
-        # Очищаем старые кнопки
-        for btn in getattr(self, 'tab_buttons', {}).values():
-            btn["frame"].destroy() if "frame" in btn else btn["btn"].destroy()
-        self.tab_buttons = {}
-        self.tab_frame.config(bg=THEMES[self.current_theme]["editor_bg"])
-        if not self.tabs:
-            # Если вкладок нет, показываем кнопку +
-            add_btn = tk.Button(self.tab_frame, text="+", bd=0, bg=THEMES[self.current_theme]["editor_bg"], fg="#aaa", font=("Arial", 12, "bold"), command=self.open_file)
-            add_btn.pack(side="left", padx=(4,0))
-            self.tab_buttons["__add__"] = {"btn": add_btn}
-            return
-        for i, tab in enumerate(self.tabs):
-            active_bg = THEMES[self.current_theme].get("output_bg", "#222") if tab is self.active_tab else THEMES[self.current_theme]["editor_bg"]
-            f = tk.Frame(self.tab_frame, bg=active_bg, bd=0, relief="flat")
-            f.pack(side="left", padx=(0,2), pady=2)
-            btn = tk.Button(f, text=tab["name"], bd=0, bg=active_bg, fg=THEMES[self.current_theme]["editor_fg"] if tab is self.active_tab else "#aaa", font=("Consolas", 10, "bold"), command=lambda t=tab: self._switch_tab(t), activebackground=THEMES[self.current_theme]["output_bg"])
-            btn.pack(side="left")
-            close_btn = tk.Button(f, text="✕", bd=0, bg=active_bg, fg="#e06c75", font=("Arial", 9), command=lambda t=tab: self._close_tab(t), activebackground=THEMES[self.current_theme]["output_bg"])
-            close_btn.pack(side="left")
-            self.tab_buttons[tab["path"]] = {"frame": f, "btn": btn, "close": close_btn}
-        # Кнопка для новой вкладки
-        add_btn = tk.Button(self.tab_frame, text="+", bd=0, bg=THEMES[self.current_theme]["editor_bg"], fg="#aaa", font=("Arial", 12, "bold"), command=self.open_file)
-        add_btn.pack(side="left", padx=(4,0))
-        self.tab_buttons["__add__"] = {"btn": add_btn}
+        self.tab_bar.update(self.tabs, self.active_tab)
 
     def _switch_tab(self, tab):
-        if self.active_tab:
-            # Сохраняем содержимое предыдущей вкладки
-            self.active_tab["content"] = self.editor.get("1.0", tk.END)
+        editor = tab.get("editor")
+        if editor is None:
+            if self.active_tab is None:
+                # Вкладок нет - свободный редактор достаётся этой вкладке
+                editor = self.editor
+            else:
+                editor = self._create_editor()
+            tab["editor"] = editor
         self.active_tab = tab
+        if editor is not self.editor:
+            # Переключение только меняет видимый редактор, текст не копируется
+            self.editor.pack_forget()
+            editor.pack(expand=True, fill="both")
+            self.editor = editor
+        if "content" in tab:
+            self._load_tab_content(tab)
+        self._touch_editor(tab)
+        self._render_tabs()
+
+    def _touch_editor(self, tab):
+        """Отмечает вкладку как недавно открытую и выгружает лишние редакторы"""
+        self._editor_lru = [t for t in self._editor_lru if t is not tab]
+        self._editor_lru.append(tab)
+        while len(self._editor_lru) > self.MAX_OPEN_EDITORS:
+            self._unload_editor(self._editor_lru.pop(0))
+
+    def _unload_editor(self, tab):
+        """Выгружает редактор вкладки, сохраняя текст, подсветку, прокрутку и курсор"""
+        editor = tab.pop("editor")
+        tab["content"] = editor.get("1.0", "end-1c")
+        snapshot = editor.highlight_snapshot()
+        # Снимок подсветки годен, пока содержимое вкладки не изменилось
+        tab["highlight"] = (hash(tab["content"]), snapshot) if snapshot else None
+        tab["view"] = (editor.yview()[0], editor.index(tk.INSERT))
+        editor.destroy()
+
+    def _load_tab_content(self, tab):
+        """Загружает в редактор вкладки её текст; хранится он только до этого"""
+        content = tab.pop("content")
         self.editor.delete("1.0", tk.END)
-        self.editor.insert("1.0", tab["content"])
+        self.editor.insert("1.0", content)
+        self.editor.edit_reset()
+        if not tab["dirty"]:
+            self.editor.mark_saved()
+        view = tab.pop("view", None)
+        if view:
+            self.editor.mark_set(tk.INSERT, view[1])
+            self.editor.yview_moveto(view[0])
         
         # Устанавливаем правильное расширение файла для подсветки синтаксиса
         if tab["path"]:
@@ -567,32 +667,30 @@ class IDE(ctk.CTk):
         else:
             # Для безымянных файлов используем Python по умолчанию
             self.editor.set_file_extension('.py')
-            
+        
+        # Неизменённая вкладка получает подсветку из снимка без лексирования
+        highlight = tab.pop("highlight", None)
+        if highlight and highlight[0] == hash(content) and self.editor.restore_highlight(highlight[1]):
+            return
         self.editor.force_highlight()
-        self._render_tabs()
 
     def _close_tab(self, tab):
         idx = self.tabs.index(tab)
         self.tabs.remove(tab)
+        self._editor_lru = [t for t in self._editor_lru if t is not tab]
+        editor = tab.pop("editor", None)
         if self.active_tab is tab:
-            # Переключаемся на соседнюю вкладку
+            # Редактор закрытой вкладки освобождается
+            self.active_tab = None
             if self.tabs:
-                self.active_tab = self.tabs[max(0, idx-1)]
-                self.editor.delete("1.0", tk.END)
-                self.editor.insert("1.0", self.active_tab["content"])
-                
-                # Устанавливаем правильное расширение файла для подсветки синтаксиса
-                if self.active_tab["path"]:
-                    file_extension = os.path.splitext(self.active_tab["path"])[1]
-                    self.editor.set_file_extension(file_extension)
-                else:
-                    # Для безымянных файлов используем Python по умолчанию
-                    self.editor.set_file_extension('.py')
-                    
-                self.editor.force_highlight()
+                # Переключаемся на соседнюю вкладку
+                self._switch_tab(self.tabs[max(0, idx-1)])
             else:
-                self.active_tab = None
                 self.editor.delete("1.0", tk.END)
+                self.editor.edit_reset()
+                self.editor.mark_saved()
+        if editor is not None and editor is not self.editor:
+            editor.destroy()
         self._render_tabs()
 
     def _show_find_dialog(self, event=None):
@@ -854,6 +952,7 @@ pause > nul
                 "description": description_var.get()
             }
             self._save_project_config()
+            self._update_module_members()
             messagebox.showinfo("Успех", "Конфигурация запуска сохранена")
             win.destroy()
         
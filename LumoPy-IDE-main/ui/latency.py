@@ -0,0 +1,88 @@
+import json
+import os
+import time
+from collections import deque
+from functools import wraps
+
+# Сколько последних замеров каждого этапа хранится
+WINDOW = 1000
+# Если переменная задана, при выходе из IDE замеры пишутся в этот файл
+LOG_ENV = "LUMOPY_LATENCY_LOG"
+
+
+class LatencyStats:
+    """Скользящие замеры времени по этапам (get_completions, show_completions...)
+    с процентилями p50/p95/p99 в миллисекундах"""
+
+    def __init__(self, window=WINDOW):
+        self.window = window
+        self.samples = {}  # этап -> deque длительностей в секундах
+
+    def record(self, stage, seconds):
+        # Пишут и поток Tk, и потоки источников: setdefault атомарен
+        samples = self.samples.get(stage)
+        if samples is None:
+            samples = self.samples.setdefault(stage, deque(maxlen=self.window))
+        samples.append(seconds)
+
+    def measure(self, stage):
+        """Декоратор: замеряет каждый вызов функции как этап stage"""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.record(stage, time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    def summary(self):
+        """этап -> {"count", "p50", "p95", "p99", "max"} в миллисекундах"""
+        result = {}
+        # Копии: пока считаем, потоки источников могут дописывать замеры
+        for stage, samples in list(self.samples.items()):
+            ordered = sorted(samples.copy())
+            if not ordered:
+                continue
+            result[stage] = {
+                "count": len(ordered),
+                "p50": _percentile(ordered, 50) * 1000,
+                "p95": _percentile(ordered, 95) * 1000,
+                "p99": _percentile(ordered, 99) * 1000,
+                "max": ordered[-1] * 1000,
+            }
+        return result
+
+    def report(self):
+        """Таблица замеров для вывода в консоль"""
+        lines = [f"{'этап':<24}{'n':>7}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}"]
+        for stage, row in sorted(self.summary().items()):
+            lines.append(f"{stage:<24}{row['count']:>7}{row['p50']:>9.2f}{row['p95']:>9.2f}"
+                         f"{row['p99']:>9.2f}{row['max']:>9.2f}")
+        return "\n".join(lines)
+
+    def reset(self):
+        self.samples.clear()
+
+    def dump(self, path=None):
+        """Пишет summary в JSON-файл (по умолчанию - из LUMOPY_LATENCY_LOG)"""
+        path = path or os.environ.get(LOG_ENV)
+        if not path or not self.samples:
+            return
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(self.summary(), f, ensure_ascii=False, indent=2)
+        except OSError as e:
+            print(f"Ошибка записи замеров задержки: {e}")
+
+
+def _percentile(ordered, percent):
+    # Ближайший ранг: p50 из [1, 2, 3, 4] - 2
+    rank = max(0, -(-len(ordered) * percent // 100) - 1)
+    return ordered[rank]
+
+
+# Общие замеры автодополнения для всех редакторов
+stats = LatencyStats()
@@ -0,0 +1,185 @@
+import hashlib
+import json
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import threading
+from ui.completion_index import PrefixIndex
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".cache")
+# Сколько ждём импорта модуля в отдельном процессе
+INTROSPECT_TIMEOUT = 10
+CACHE_VERSION = 2
+
+# Выполняется выбранным интерпретатором: импортирует модуль (или берёт
+# атрибут модуля, например os.path или collections.OrderedDict) и печатает
+# его имена с сигнатурами вызываемых, файл модуля и время изменения файла
+_INTROSPECT = r"""
+import importlib, inspect, json, os, sys
+name = sys.argv[1]
+parts = name.split('.')
+result = None
+for i in range(len(parts), 0, -1):
+    try:
+        module = importlib.import_module('.'.join(parts[:i]))
+    except Exception:
+        continue
+    obj = module
+    try:
+        for attr in parts[i:]:
+            obj = getattr(obj, attr)
+    except AttributeError:
+        break
+    path = getattr(module, '__file__', None)
+    members = [n for n in dir(obj) if not n.startswith('_')]
+    signatures = {}
+    for n in members:
+        try:
+            value = getattr(obj, n)
+            if callable(value):
+                signatures[n] = str(inspect.signature(value))
+        except Exception:
+            pass
+    result = {
+        'file': path,
+        'mtime': os.path.getmtime(path) if path and os.path.exists(path) else None,
+        'members': members,
+        'signatures': signatures,
+    }
+    break
+sys.stdout.write(json.dumps(result))
+"""
+
+
+def resolve_interpreter(command):
+    """Полный путь к интерпретатору Python из команды запуска проекта"""
+    if command and "python" in os.path.basename(command).lower():
+        path = shutil.which(command)
+        if path:
+            return path
+    return sys.executable
+
+
+class ModuleMembers:
+    """Имена модулей для дополнения после точки (os., json., np.linalg.).
+
+    Модули импортируются не в IDE, а в отдельном процессе выбранного
+    интерпретатора, по одному в фоновом потоке. Результаты хранятся на диске
+    отдельно для каждого интерпретатора и считаются верными, пока не изменилось
+    время изменения файла модуля. Первый запрос модуля возвращает None,
+    пока идёт импорт; следующие отвечают из памяти.
+    """
+
+    def __init__(self, interpreter, cwd=None):
+        self.interpreter = interpreter
+        self.cwd = cwd
+        key = hashlib.sha1(interpreter.encode("utf-8")).hexdigest()[:12]
+        self.cache_path = os.path.join(CACHE_DIR, f"modules-{key}.json")
+        self.entries = self._load()  # имя -> {"file", "mtime", "members", "signatures"} или None
+        self.indexes = {}  # имя -> PrefixIndex, проверенные в этом сеансе
+        self._pending = set()
+        self._requests = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+
+    def members(self, name):
+        """PrefixIndex имён модуля, None если ещё не готов или не импортируется"""
+        index = self.indexes.get(name)
+        if index is not None:
+            return index
+        with self._lock:
+            if name in self._pending:
+                return None
+            entry = self.entries.get(name, False)
+        if entry is None:
+            # Модуль не импортировался - повторно не пробуем
+            return None
+        if entry and self._is_fresh(entry):
+            index = self.indexes[name] = PrefixIndex(entry["members"])
+            return index
+        self._request(name)
+        return None
+
+    def signature(self, module, name):
+        """Сигнатура name из модуля module или None; неизвестный модуль
+        ставится в очередь, как и в members"""
+        if self.members(module) is None:
+            return None
+        entry = self.entries.get(module)
+        return entry["signatures"].get(name) if entry else None
+
+    def is_pending(self, name):
+        with self._lock:
+            return name in self._pending
+
+    def close(self):
+        self._closed = True
+        self._requests.put(None)
+
+    def _is_fresh(self, entry):
+        path = entry.get("file")
+        if not path:
+            # Встроенный модуль: меняется только вместе с интерпретатором
+            return True
+        try:
+            return os.path.getmtime(path) == entry.get("mtime")
+        except OSError:
+            return False
+
+    def _request(self, name):
+        with self._lock:
+            self._pending.add(name)
+        self._requests.put(name)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            name = self._requests.get()
+            if name is None or self._closed:
+                return
+            entry = self._introspect(name)
+            with self._lock:
+                self.entries[name] = entry
+                self._pending.discard(name)
+            self.indexes.pop(name, None)
+            self._save()
+
+    def _introspect(self, name):
+        try:
+            result = subprocess.run(
+                [self.interpreter, "-c", _INTROSPECT, name],
+                cwd=self.cwd, stdin=subprocess.DEVNULL, capture_output=True,
+                timeout=INTROSPECT_TIMEOUT,
+                creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0))
+            return json.loads(result.stdout.decode("utf-8", errors="ignore") or "null")
+        except (OSError, ValueError, subprocess.TimeoutExpired) as e:
+            print(f"Ошибка получения имён модуля {name}: {e}")
+            return None
+
+    def _load(self):
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == CACHE_VERSION:
+                return data["modules"]
+        except (OSError, ValueError, KeyError):
+            pass
+        return {}
+
+    def _save(self):
+        with self._lock:
+            # Неудачные импорты помним только до конца сеанса
+            data = {name: entry for name, entry in self.entries.items() if entry}
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            tmp_path = self.cache_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": CACHE_VERSION, "modules": data}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            print(f"Ошибка сохранения кэша модулей: {e}")
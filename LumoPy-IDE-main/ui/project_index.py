@@ -0,0 +1,357 @@
+import ast
+import copy
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from ui.completion_index import PrefixIndex
+
+INDEX_DIR = ".lumocfg"
+INDEX_FILE = "symbols.json"
+INDEX_VERSION = 2
+# Служебные каталоги, в которых не ищем исходники
+SKIP_DIRS = {"__pycache__", "venv", ".venv", "env", "node_modules", "build", "dist"}
+# Столько изменённых файлов разбираем в самом потоке, без пула процессов
+POOL_THRESHOLD = 32
+
+
+def parse_file(path):
+    """Имена верхнего уровня модуля: функции, классы, атрибуты и импорты,
+    а также сигнатуры функций, классов и методов классов.
+
+    Выполняется в процессе пула, поэтому функция модульная и возвращает
+    только простые типы. При ошибке разбора возвращает пустые списки.
+    """
+    symbols = {"functions": [], "classes": [], "attributes": [], "imports": {}, "signatures": {}}
+    try:
+        with open(path, "rb") as f:
+            tree = ast.parse(f.read(), filename=path)
+    except (SyntaxError, ValueError, OSError):
+        return symbols
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            symbols["functions"].append(node.name)
+            symbols["signatures"][node.name] = format_signature(node.args)
+        elif isinstance(node, ast.ClassDef):
+            symbols["classes"].append(node.name)
+            for item in node.body:
+                if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    # Метод вызывается через экземпляр или класс - без self/cls
+                    signature = format_signature(item.args, skip_first=not _is_static(item))
+                    symbols["signatures"][f"{node.name}.{item.name}"] = signature
+                    if item.name == "__init__":
+                        symbols["signatures"][node.name] = signature
+        elif isinstance(node, (ast.Assign, ast.AnnAssign, ast.AugAssign)):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            symbols["attributes"].extend(_target_names(targets))
+        elif isinstance(node, ast.Import):
+            for alias in node.names:
+                # import a.b as c -> c: a.b; import a.b -> a: a
+                if alias.asname:
+                    symbols["imports"][alias.asname] = alias.name
+                else:
+                    top = alias.name.split('.')[0]
+                    symbols["imports"][top] = top
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            for alias in node.names:
+                if alias.name != '*':
+                    symbols["imports"][alias.asname or alias.name] = f"{node.module}.{alias.name}"
+    return symbols
+
+
+def format_signature(args, skip_first=False):
+    """Строка параметров функции по узлу ast.arguments: "(a, b=1, *args)" """
+    if skip_first:
+        args = copy.copy(args)
+        if args.posonlyargs:
+            args.posonlyargs = args.posonlyargs[1:]
+        elif args.args:
+            args.args = args.args[1:]
+            # Значения по умолчанию относятся к последним параметрам
+            args.defaults = args.defaults[-len(args.args):] if args.args else []
+    try:
+        return f"({ast.unparse(args)})"
+    except Exception:
+        return "(...)"
+
+
+def _is_static(node):
+    return any(isinstance(d, ast.Name) and d.id == "staticmethod" for d in node.decorator_list)
+
+
+def _target_names(targets):
+    # a = ..., a, (b, *c) = ...; атрибуты и индексы (a.b = ..., a[0] = ...) пропускаем
+    for target in targets:
+        if isinstance(target, ast.Name):
+            yield target.id
+        elif isinstance(target, (ast.Tuple, ast.List)):
+            yield from _target_names(target.elts)
+        elif isinstance(target, ast.Starred):
+            yield from _target_names([target.value])
+
+
+def module_name(relpath):
+    """pkg/sub/mod.py -> pkg.sub.mod, pkg/__init__.py -> pkg"""
+    parts = relpath[:-3].replace(os.sep, '/').split('/')
+    if parts[-1] == "__init__":
+        parts.pop()
+    return '.'.join(parts)
+
+
+def _top_names(module, symbols):
+    # Что файл даёт общему индексу имён: пакет верхнего уровня, функции и классы
+    return {module.split('.')[0], *symbols["functions"], *symbols["classes"]}
+
+
+class ProjectIndex:
+    """Индекс имён всех .py-файлов проекта для автодополнения.
+
+    Файлы разбираются модулем ast в фоновом потоке (много файлов - в пуле
+    процессов). Результат хранится в .lumocfg/symbols.json и пересчитывается
+    только для файлов, у которых изменились mtime или размер. Сохранённые
+    во время работы файлы переразбираются по одному через update_file.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.names = PrefixIndex()  # имена верхнего уровня всех модулей и сами модули
+        self.modules = {}  # имя модуля -> PrefixIndex его имён
+        self.signatures = {}  # "модуль.имя" или "модуль.Класс.метод" -> "(параметры)"
+        self.bare_signatures = {}  # имя верхнего уровня -> сигнатура из первого модуля с ним
+        self.ready = False
+        self._files = {}  # относительный путь -> запись индекса
+        # Учёт для переразбора отдельных файлов, меняется только фоновым потоком
+        self._name_counts = {}  # имя из names -> число файлов с ним
+        self._bare = {}  # имя верхнего уровня -> {относительный путь: сигнатура}
+        self._lock = threading.Lock()
+        self._updates = set()  # файлы, ждущие переразбора
+        self._updating = True  # обновления подхватит фоновый поток; до конца индексации - он же
+        self._cancelled = threading.Event()
+        self._thread = None
+        self._executor = None
+
+    @property
+    def index_path(self):
+        return os.path.join(self.root, INDEX_DIR, INDEX_FILE)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def close(self):
+        self._cancelled.set()
+        executor = self._executor
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def update_file(self, path):
+        """Переразбирает в фоне изменённый файл проекта"""
+        relpath = os.path.relpath(os.path.abspath(path), os.path.abspath(self.root))
+        if not relpath.endswith(".py") or relpath.startswith(os.pardir) or self._cancelled.is_set():
+            return
+        with self._lock:
+            self._updates.add(relpath)
+            if self._updating:
+                return
+            self._updating = True
+        threading.Thread(target=self._run_updates, daemon=True).start()
+
+    def members(self, module):
+        """Индекс имён модуля module или None, если такого модуля в проекте нет"""
+        return self.modules.get(module)
+
+    def signature(self, module, name):
+        """Сигнатура name из модуля module; без модуля - по имени среди всех модулей"""
+        if module is None:
+            return self.bare_signatures.get(name)
+        return self.signatures.get(f"{module}.{name}")
+
+    def _run(self):
+        try:
+            cached = self._load()
+            files = {}
+            for relpath, stat in self._scan():
+                if self._cancelled.is_set():
+                    return
+                entry = cached.get(relpath)
+                if entry and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+                    files[relpath] = entry
+                else:
+                    files[relpath] = {"mtime": stat.st_mtime, "size": stat.st_size, "symbols": None}
+            stale = [relpath for relpath, entry in files.items() if entry["symbols"] is None]
+            for relpath, symbols in zip(stale, self._parse(stale)):
+                files[relpath]["symbols"] = symbols
+            if self._cancelled.is_set():
+                return
+            self._files = files
+            self._publish(files)
+            if stale or len(files) != len(cached):
+                self._save(files)
+        except Exception as e:
+            print(f"Ошибка индексации проекта: {e}")
+        # Файлы, сохранённые во время индексации, могли разобраться по старому тексту
+        self._run_updates()
+
+    def _run_updates(self):
+        while True:
+            with self._lock:
+                if not self._updates or self._cancelled.is_set():
+                    self._updating = False
+                    return
+                relpaths, self._updates = self._updates, set()
+            try:
+                old_files = self._files
+                files = dict(old_files)
+                for relpath in relpaths:
+                    path = os.path.join(self.root, relpath)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        files.pop(relpath, None)
+                        continue
+                    files[relpath] = {"mtime": stat.st_mtime, "size": stat.st_size, "symbols": parse_file(path)}
+                self._files = files
+                if self.ready:
+                    self._publish_update(old_files, files, relpaths)
+                else:
+                    self._publish(files)
+            except Exception as e:
+                print(f"Ошибка индексации проекта: {e}")
+
+    def _scan(self):
+        """(относительный путь, stat) для всех .py-файлов проекта"""
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = [d for d in dirnames if not d.startswith('.') and d not in SKIP_DIRS]
+            for name in filenames:
+                if name.endswith(".py"):
+                    path = os.path.join(dirpath, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    yield os.path.relpath(path, self.root), stat
+
+    def _parse(self, relpaths):
+        paths = [os.path.join(self.root, relpath) for relpath in relpaths]
+        if len(paths) <= POOL_THRESHOLD:
+            return [parse_file(path) for path in paths]
+        # Пул запускается из фонового потока многопоточного процесса Tk -
+        # fork в таком состоянии небезопасен, поэтому процессы порождаются заново
+        self._executor = ProcessPoolExecutor(mp_context=multiprocessing.get_context("spawn"))
+        try:
+            return list(self._executor.map(parse_file, paths, chunksize=64))
+        finally:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _publish(self, files):
+        # Индексы собираются целиком в этом потоке и подменяются одним
+        # присваиванием, так что поток Tk всегда видит согласованное состояние
+        self._name_counts = {}
+        self._bare = {}
+        modules = {}
+        signatures = {}
+        for relpath, entry in files.items():
+            self._add_file(relpath, entry["symbols"], modules, signatures)
+        self.modules = modules
+        self.signatures = signatures
+        self.bare_signatures = {name: next(iter(found.values())) for name, found in self._bare.items()}
+        self.names = PrefixIndex(self._name_counts)
+        self.ready = True
+
+    def _publish_update(self, old_files, files, relpaths):
+        # Переразобраны отдельные файлы: в копиях индексов заменяются только
+        # их модули, и копии подменяются так же, как в _publish
+        modules = self.modules.copy()
+        signatures = self.signatures.copy()
+        bare_signatures = self.bare_signatures.copy()
+        names = self.names.copy()
+        touched = set()
+        for relpath in relpaths:
+            entry = old_files.get(relpath)
+            if entry:
+                touched.update(self._remove_file(relpath, entry["symbols"], modules, signatures))
+            entry = files.get(relpath)
+            if entry:
+                touched.update(self._add_file(relpath, entry["symbols"], modules, signatures))
+        # Имя, оставшееся в файле после переразбора, индекс не трогает
+        for name in touched:
+            found = self._bare.get(name)
+            if found:
+                bare_signatures[name] = next(iter(found.values()))
+            else:
+                bare_signatures.pop(name, None)
+            if name in self._name_counts:
+                names.add(name)
+            else:
+                names.discard(name)
+        self.modules = modules
+        self.signatures = signatures
+        self.bare_signatures = bare_signatures
+        self.names = names
+
+    def _add_file(self, relpath, symbols, modules, signatures):
+        """Вносит имена файла в modules, signatures и учёт имён; возвращает
+        имена, для которых надо обновить names и bare_signatures"""
+        module = module_name(relpath)
+        if not module:
+            return ()
+        top = _top_names(module, symbols)
+        touched = set(top)
+        for name, signature in symbols["signatures"].items():
+            signatures[f"{module}.{name}"] = signature
+            if '.' not in name:
+                self._bare.setdefault(name, {})[relpath] = signature
+                touched.add(name)
+        members = symbols["functions"] + symbols["classes"] + symbols["attributes"] + list(symbols["imports"])
+        modules[module] = PrefixIndex(members)
+        counts = self._name_counts
+        for name in top:
+            counts[name] = counts.get(name, 0) + 1
+        return touched
+
+    def _remove_file(self, relpath, symbols, modules, signatures):
+        """Обратное _add_file для прежнего разбора файла"""
+        module = module_name(relpath)
+        if not module:
+            return ()
+        top = _top_names(module, symbols)
+        touched = set(top)
+        for name in symbols["signatures"]:
+            signatures.pop(f"{module}.{name}", None)
+            if '.' not in name:
+                found = self._bare[name]
+                del found[relpath]
+                if not found:
+                    del self._bare[name]
+                touched.add(name)
+        modules.pop(module, None)
+        counts = self._name_counts
+        for name in top:
+            if counts[name] > 1:
+                counts[name] -= 1
+            else:
+                del counts[name]
+        return touched
+
+    def _load(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == INDEX_VERSION:
+                return data["files"]
+        except (OSError, ValueError, KeyError):
+            pass
+        return {}
+
+    def _save(self, files):
+        try:
+            os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+            tmp_path = self.index_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": INDEX_VERSION, "files": files}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            print(f"Ошибка сохранения индекса проекта: {e}")
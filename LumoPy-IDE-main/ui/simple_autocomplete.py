@@ -1,8 +1,52 @@
 import tkinter as tk
 from tkinter import ttk
-import re
 import builtins
 import keyword
+import queue
+import re
+import time
+from ui.completion_index import PrefixIndex, FuzzyMatcher
+from ui.completion_providers import (LIMIT, BufferProvider, CompletionRequest, ModuleMembersProvider,
+                                     ProjectProvider, StaticProvider, executor)
+from ui.symbol_table import extract_names
+from ui.latency import stats
+
+BUILTIN_FUNCTIONS = frozenset(name for name in dir(builtins) if not name.startswith('_'))
+BASIC_COMPLETIONS = [
+    'print', 'len', 'str', 'int', 'float', 'list', 'dict', 'tuple', 'set',
+    'range', 'enumerate', 'zip', 'map', 'filter', 'sorted', 'reversed',
+    'open', 'input', 'type', 'isinstance', 'hasattr', 'getattr', 'setattr',
+    'dir', 'help', 'id', 'hash', 'abs', 'round', 'min', 'max', 'sum',
+    'all', 'any', 'bool', 'chr', 'ord', 'bin', 'hex', 'oct', 'format',
+    'join', 'split', 'strip', 'replace', 'find', 'index', 'count',
+    'append', 'extend', 'insert', 'remove', 'pop', 'clear', 'copy',
+    'keys', 'values', 'items', 'get', 'update', 'setdefault',
+    'True', 'False', 'None', 'self', 'def', 'class', 'import', 'from',
+    'if', 'else', 'elif', 'for', 'while', 'try', 'except', 'finally',
+    'with', 'as', 'return', 'yield', 'break', 'continue', 'pass',
+    'raise', 'assert', 'del', 'global', 'nonlocal', 'lambda'
+]
+
+# Сколько символов по обе стороны от курсора просматривается в поисках
+# границ слова
+WORD_WINDOW = 256
+_WORD_TAIL = re.compile(r'[\w.]*$')
+_WORD_HEAD = re.compile(r'[\w.]*')
+# Как часто поток Tk забирает ответы асинхронных источников
+POLL_INTERVAL = 10
+
+# Индекс встроенных имён, ключевых слов и базовых предложений один на все
+# редакторы и строится при первом автодополнении
+_static_index = None
+# Нечёткий поиск тоже общий: недавно выбранные слова поднимаются во всех вкладках
+matcher = FuzzyMatcher()
+
+
+def static_index():
+    global _static_index
+    if _static_index is None:
+        _static_index = PrefixIndex(list(BUILTIN_FUNCTIONS) + keyword.kwlist + BASIC_COMPLETIONS)
+    return _static_index
 
 class SimpleAutocomplete:
     def __init__(self, editor):
@@ -13,111 +57,163 @@ class SimpleAutocomplete:
         self.current_completion = 0
         
         # Базовые предложения автодополнения
-        self.builtin_functions = [name for name in dir(builtins) if not name.startswith('_')]
+        self.builtin_functions = BUILTIN_FUNCTIONS
         self.keywords = keyword.kwlist
-        self.basic_completions = [
-            'print', 'len', 'str', 'int', 'float', 'list', 'dict', 'tuple', 'set',
-            'range', 'enumerate', 'zip', 'map', 'filter', 'sorted', 'reversed',
-            'open', 'input', 'type', 'isinstance', 'hasattr', 'getattr', 'setattr',
-            'dir', 'help', 'id', 'hash', 'abs', 'round', 'min', 'max', 'sum',
-            'all', 'any', 'bool', 'chr', 'ord', 'bin', 'hex', 'oct', 'format',
-            'join', 'split', 'strip', 'replace', 'find', 'index', 'count',
-            'append', 'extend', 'insert', 'remove', 'pop', 'clear', 'copy',
-            'keys', 'values', 'items', 'get', 'update', 'setdefault',
-            'True', 'False', 'None', 'self', 'def', 'class', 'import', 'from',
-            'if', 'else', 'elif', 'for', 'while', 'try', 'except', 'finally',
-            'with', 'as', 'return', 'yield', 'break', 'continue', 'pass',
-            'raise', 'assert', 'del', 'global', 'nonlocal', 'lambda'
+        self.basic_completions = BASIC_COMPLETIONS
+        # Индекс имён проекта (ProjectIndex), задаётся IDE
+        self.project_index = None
+        # Имена установленных модулей (ModuleMembers), задаётся IDE
+        self.module_members = None
+        # Модуль, имена которого ещё импортируются в фоне
+        self.waiting_module = None
+        # Источники предложений: синхронные ищут сразу, асинхронные - в пуле
+        # потоков, их ответы приходят через очередь и сливаются по мере прихода
+        self.providers = [
+            BufferProvider(matcher),
+            StaticProvider(matcher, static_index),
+            ProjectProvider(matcher),
+            ModuleMembersProvider(matcher),
         ]
+        self._request = None
+        self._results = queue.Queue()
+        self._poll_id = None
+        
+        # Один отложенный запрос: новое нажатие отменяет прежний
+        self._request_id = None
+        # Последний запрос и его результат - для сужения без нового поиска
+        self._last_word = ''
+        self._last_completions = None
+        self._shown = False
+        self._geometry = None
         
         # Привязываем события
         self.editor.bind('<KeyRelease>', self.on_key_release)
         self.editor.bind('<Control-space>', self.show_completions)
         self.editor.bind('<Escape>', self.hide_popup)
+        # Курсор переставлен мышью - прежний запрос больше не нужен
+        self.editor.bind('<ButtonRelease-1>', lambda e: self.hide_popup(), add='+')
         
     def get_current_word(self):
         """Получает текущее слово под курсором"""
         cursor_pos = self.editor.index(tk.INSERT)
         line, col = map(int, cursor_pos.split('.'))
         
-        # Получаем текст текущей строки
-        line_text = self.editor.get(f"{line}.0", f"{line}.end")
+        # Берём только окно вокруг курсора: длина строки на цену не влияет.
+        # Tk сам обрезает индекс за концом строки
+        start = max(0, col - WORD_WINDOW)
+        before = self.editor.get(f"{line}.{start}", cursor_pos)
+        after = self.editor.get(cursor_pos, f"{line}.{col + WORD_WINDOW}")
         
-        # Ищем начало слова
-        word_start = col
-        while word_start > 0 and (line_text[word_start - 1].isalnum() or line_text[word_start - 1] in '_.'):
-            word_start -= 1
-            
-        # Ищем конец слова
-        word_end = col
-        while word_end < len(line_text) and (line_text[word_end].isalnum() or line_text[word_end] in '_.'):
-            word_end += 1
-            
-        current_word = line_text[word_start:word_end]
+        # Начало и конец слова ищем регулярными выражениями, а не циклом
+        word_start = col - len(_WORD_TAIL.search(before).group())
+        word_end = col + len(_WORD_HEAD.match(after).group())
+        
+        current_word = before[word_start - start:] + after[:word_end - col]
         return current_word, word_start, word_end
         
+    @stats.measure("get_completions")
     def get_completions(self, word):
-        """Получает предложения автодополнения для слова"""
+        """Получает предложения автодополнения для слова (все источники сразу)"""
         if not word:
             return []
-            
-        word_lower = word.lower()
-        completions = []
+        self.waiting_module = None
+        request = CompletionRequest(word)
+        nearby = self._nearby(word)
+        for provider in self.providers:
+            indexes = provider.prepare(self, word)
+            if indexes is not None:
+                request.merge(provider.search(indexes, word, nearby))
+        return request.best()
         
-        # Добавляем встроенные функции
-        for func in self.builtin_functions:
-            if func.lower().startswith(word_lower):
-                completions.append(func)
-                
-        # Добавляем ключевые слова
-        for kw in self.keywords:
-            if kw.lower().startswith(word_lower):
-                completions.append(kw)
-                
-        # Добавляем базовые предложения
-        for comp in self.basic_completions:
-            if comp.lower().startswith(word_lower):
-                completions.append(comp)
-                
-        # Получаем переменные из текущего кода
-        code = self.editor.get("1.0", tk.END)
-        variables = self.extract_variables(code)
-        for var in variables:
-            if var.lower().startswith(word_lower):
-                completions.append(var)
-                
-        # Убираем дубликаты и сортируем
-        completions = sorted(list(set(completions)))
-        return completions[:20]  # Ограничиваем количество
+    def resolve_module(self, word):
+        """Полное имя модуля перед последней точкой: np.linalg.no -> numpy.linalg"""
+        self.editor.symbol_index()
+        return self.editor.symbols.resolve_module(word.rpartition('.')[0])
         
-    def extract_variables(self, code):
-        """Извлекает переменные из кода"""
-        variables = []
+    def _nearby(self, word):
+        # Имена рядом с курсором поднимаются выше
+        if '.' in word:
+            return ()
+        line = int(self.editor.index(tk.INSERT).split('.')[0]) - 1
+        return self.editor.symbols.nearby_names(line)
+        
+    def _start_request(self, word):
+        """Запускает источники: синхронные отвечают сразу, асинхронные - позже"""
+        self.cancel_request()
+        self.waiting_module = None
+        request = self._request = CompletionRequest(word)
+        nearby = self._nearby(word)
+        for provider in self.providers:
+            indexes = provider.prepare(self, word)
+            if indexes is None:
+                continue
+            if not provider.asynchronous:
+                start = time.perf_counter()
+                request.merge(provider.search(indexes, word, nearby))
+                stats.record(type(provider).__name__, time.perf_counter() - start)
+                continue
+            request.pending += 1
+            future = executor().submit(self._run_provider, request, provider, indexes, word, nearby)
+            request.futures.append(future)
+        if request.pending:
+            self._poll_id = self.editor.after(POLL_INTERVAL, self._poll_results)
+        return request
+        
+    def _run_provider(self, request, provider, indexes, word, nearby):
+        # Поток пула: к Tk не обращаемся, ответ уходит в очередь
+        pairs = []
+        if not request.cancelled:
+            start = time.perf_counter()
+            try:
+                pairs = provider.search(indexes, word, nearby)
+            except Exception as e:
+                print(f"Ошибка источника автодополнения: {e}")
+            stats.record(type(provider).__name__, time.perf_counter() - start)
+        self._results.put((request, pairs))
         
-        # Ищем присваивания переменных
-        assignment_pattern = r'(\w+)\s*='
-        matches = re.findall(assignment_pattern, code)
-        variables.extend(matches)
+    def _poll_results(self):
+        self._poll_id = None
+        arrived = False
+        while True:
+            try:
+                request, pairs = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if request is not self._request:
+                continue  # ответ отменённого запроса
+            request.pending -= 1
+            request.merge(pairs)
+            arrived = True
+        request = self._request
+        if request is None:
+            return
+        if arrived:
+            if request.done:
+                # От нажатия до ответа последнего источника
+                stats.record("all_providers", time.perf_counter() - request.started)
+            self._present(request)
+        if self._request is request and request.pending:
+            self._poll_id = self.editor.after(POLL_INTERVAL, self._poll_results)
+        
+    def cancel_request(self):
+        """Отменяет текущий запрос: его результаты больше не покажутся"""
+        if self._request is not None:
+            self._request.cancel()
+            self._request = None
+        if self._poll_id:
+            self.editor.after_cancel(self._poll_id)
+            self._poll_id = None
         
-        # Ищем параметры функций
-        def_pattern = r'def\s+\w+\s*\(([^)]*)\)'
-        matches = re.findall(def_pattern, code)
-        for match in matches:
-            params = [p.strip() for p in match.split(',')]
-            for param in params:
-                if param and not param.startswith('*'):
-                    variables.append(param)
-                    
-        # Ищем параметры классов
-        class_pattern = r'class\s+\w+\s*\(([^)]*)\)'
-        matches = re.findall(class_pattern, code)
-        for match in matches:
-            params = [p.strip() for p in match.split(',')]
-            for param in params:
-                if param and not param.startswith('*'):
-                    variables.append(param)
-                    
-        return list(set(variables))
+    def destroy(self):
+        """Снимает отложенные вызовы: редактор удаляется вместе с окном списка"""
+        if self._request_id:
+            self.editor.after_cancel(self._request_id)
+            self._request_id = None
+        self.cancel_request()
+        
+    def extract_variables(self, code):
+        """Извлекает переменные из кода"""
+        return list(set(extract_names(code)))
         
     def create_popup(self):
         """Создает всплывающее окно автодополнения"""
@@ -125,8 +221,11 @@ class SimpleAutocomplete:
             self.popup.destroy()
             
         self.popup = tk.Toplevel(self.editor)
+        self.popup.withdraw()  # покажет show_completions, когда будет где
         self.popup.overrideredirect(True)
         self.popup.configure(bg='#2d2d2d')
+        self._shown = False
+        self._geometry = None
         
         # Создаем рамку
         frame = tk.Frame(self.popup, bg='#2d2d2d', relief='solid', bd=1)
@@ -153,31 +252,52 @@ class SimpleAutocomplete:
         self.listbox.bind('<Return>', self.on_select)
         self.listbox.bind('<Escape>', self.hide_popup)
         
+    @stats.measure("show_completions")
     def show_completions(self, event=None):
         """Показывает автодополнение"""
+        if self._request_id:
+            self.editor.after_cancel(self._request_id)
+            self._request_id = None
         current_word, word_start, word_end = self.get_current_word()
         
         if len(current_word) < 1:
             self.hide_popup()
             return
             
-        # Получаем предложения
-        self.completions = self.get_completions(current_word)
+        last = self._last_completions
+        if (last is not None and len(last) < LIMIT and '.' not in current_word
+                and current_word.startswith(self._last_word)):
+            # Прошлый результат не был обрезан, значит содержит все слова,
+            # подходящие и под продолжение запроса - ищем только среди них
+            self.cancel_request()
+            request = self._request = CompletionRequest(current_word)
+            request.merge(matcher.search_scored([PrefixIndex(last)], current_word, LIMIT))
+        else:
+            request = self._start_request(current_word)
+        self._present(request)
+        
+    def _present(self, request):
+        """Показывает слитые на данный момент результаты запроса"""
+        self.completions = request.best()
+        if request.done:
+            self._last_word = request.word
+            self._last_completions = self.completions
         
         if not self.completions:
+            if not request.done:
+                return  # подождём асинхронные источники
             self.hide_popup()
+            if self.waiting_module:
+                # Имена модуля ещё собираются - спросим ещё раз чуть позже
+                self._request_id = self.editor.after(300, self.show_completions)
             return
             
         # Создаем окно если нужно
         if not self.popup:
             self.create_popup()
             
-        # Очищаем список
-        self.listbox.delete(0, tk.END)
-        
-        # Добавляем предложения
-        for completion in self.completions:
-            self.listbox.insert(tk.END, completion)
+        # Обновляем только изменившиеся строки списка
+        self._update_listbox(self.completions)
             
         # Позиционируем окно
         cursor_pos = self.editor.index(tk.INSERT)
@@ -188,30 +308,66 @@ class SimpleAutocomplete:
             window_y = self.editor.winfo_rooty() + y + h
             
             # Устанавливаем размер окна
-            self.popup.geometry(f"200x{min(len(self.completions) * 20 + 10, 160)}+{window_x}+{window_y}")
-            self.popup.deiconify()
+            geometry = f"200x{min(len(self.completions) * 20 + 10, 160)}+{window_x}+{window_y}"
+            if geometry != self._geometry:
+                self.popup.geometry(geometry)
+                self._geometry = geometry
             
-            # Выбираем первый элемент
-            if self.listbox.size() > 0:
+            if not request.shown:
+                # Выбираем первый элемент; поздние ответы выбор не сбивают
+                self.listbox.selection_clear(0, tk.END)
                 self.listbox.selection_set(0)
+                self.listbox.see(0)
                 self.current_completion = 0
-                
-            # Фокусируемся на списке
-            self.listbox.focus_set()
+                request.shown = True
+            else:
+                self.current_completion = min(self.current_completion, len(self.completions) - 1)
+                self.listbox.selection_clear(0, tk.END)
+                self.listbox.selection_set(self.current_completion)
+            
+            if not self._shown:
+                self.popup.deiconify()
+                self._shown = True
+                # Фокус переходит к списку только при появлении окна
+                self.listbox.focus_set()
+
+    def _update_listbox(self, items):
+        listbox = self.listbox
+        old = listbox.get(0, tk.END)
+        for i, item in enumerate(items[:len(old)]):
+            if old[i] != item:
+                listbox.delete(i)
+                listbox.insert(i, item)
+        if len(old) > len(items):
+            listbox.delete(len(items), tk.END)
+        elif len(items) > len(old):
+            listbox.insert(tk.END, *items[len(old):])
             
     def hide_popup(self, event=None):
         """Скрывает всплывающее окно"""
+        if self._request_id:
+            self.editor.after_cancel(self._request_id)
+            self._request_id = None
+        self.cancel_request()
+        self._last_completions = None
         if self.popup:
             self.popup.withdraw()
+            self._shown = False
             self.editor.focus_set()
             
     def on_key_release(self, event):
         """Обрабатывает отпускание клавиши"""
         # Показываем автодополнение только для букв и цифр
         if event.char and (event.char.isalnum() or event.char in '_.'):
-            self.editor.after(100, self.show_completions)  # Небольшая задержка
+            self._schedule_update()
         else:
             self.hide_popup()
+
+    def _schedule_update(self):
+        # Небольшая задержка; прежний запрос отменяется
+        if self._request_id:
+            self.editor.after_cancel(self._request_id)
+        self._request_id = self.editor.after(100, self.show_completions)
             
     def on_popup_key(self, event):
         """Обрабатывает нажатия клавиш в окне автодополнения"""
@@ -238,6 +394,17 @@ class SimpleAutocomplete:
         elif event.keysym == 'Escape':
             self.hide_popup()
             return 'break'
+        elif event.char and (event.char.isalnum() or event.char in '_.'):
+            # Слово продолжается: окно остаётся, список обновится на месте
+            self.editor.insert(tk.INSERT, event.char)
+            self.editor.schedule_highlight()
+            self._schedule_update()
+            return 'break'
+        elif event.keysym == 'BackSpace':
+            self.editor.delete("insert-1c")
+            self.editor.schedule_highlight()
+            self._schedule_update()
+            return 'break'
         else:
             # Если нажата любая другая клавиша, скрываем окно
             self.hide_popup()
@@ -253,6 +420,7 @@ class SimpleAutocomplete:
             return
             
         completion = self.completions[self.current_completion]
+        matcher.note_used(completion)
         
         # Получаем текущее слово
         current_word, word_start, word_end = self.get_current_word()
@@ -0,0 +1,195 @@
+import re
+from ui.completion_index import PrefixIndex
+
+_ASSIGNMENT = re.compile(r'(\w+)\s*=')
+_DEF_PARAMS = re.compile(r'def\s+\w+\s*\(([^)]*)\)')
+_CLASS_BASES = re.compile(r'class\s+\w+\s*\(([^)]*)\)')
+_IMPORT = re.compile(r'^\s*import\s+([\w.,\s]+?)\s*(?:#.*)?$')
+_FROM_IMPORT = re.compile(r'^\s*from\s+([\w.]+)\s+import\s+\(?([\w,\s]+?)\)?\s*(?:#.*)?$')
+
+
+def extract_names(code):
+    """Имена из присваиваний, параметров функций и базовых классов"""
+    names = _ASSIGNMENT.findall(code)
+    for pattern in (_DEF_PARAMS, _CLASS_BASES):
+        for match in pattern.findall(code):
+            for param in match.split(','):
+                param = param.strip()
+                if param and not param.startswith('*'):
+                    names.append(param)
+    return names
+
+
+def extract_imports(line):
+    """Пары (имя в модуле, полное имя модуля) из строки импорта"""
+    imports = []
+    match = _IMPORT.match(line)
+    if match:
+        for part in match.group(1).split(','):
+            words = part.split()
+            if len(words) == 3 and words[1] == 'as':
+                imports.append((words[2], words[0]))
+            elif len(words) == 1:
+                top = words[0].split('.')[0]
+                imports.append((top, top))
+        return imports
+    match = _FROM_IMPORT.match(line)
+    if match and not match.group(1).startswith('.'):
+        for part in match.group(2).split(','):
+            words = part.split()
+            if len(words) == 3 and words[1] == 'as':
+                imports.append((words[2], f"{match.group(1)}.{words[0]}"))
+            elif len(words) == 1:
+                imports.append((words[0], f"{match.group(1)}.{words[0]}"))
+    return imports
+
+
+class SymbolTable:
+    """Имена буфера по строкам с общим индексом для автодополнения.
+
+    Правки приходят теми же уведомлениями splice, что и у подсветки; имена
+    пересчитываются только для изменённых строк при следующем запросе.
+    Строки нумеруются с нуля.
+    """
+
+    def __init__(self, line_count=1):
+        self.index = PrefixIndex()
+        self.reset(line_count)
+
+    def reset(self, line_count):
+        """Помечает все строки как непросмотренные"""
+        self.lines = [None] * max(1, line_count)  # кортеж имён строки или None
+        self.line_imports = [None] * len(self.lines)  # импорты строки или None
+        self.counts = {}  # имя -> число строк, где оно встречается
+        self.aliases = {}  # имя импорта -> {полное имя модуля: число строк}
+        self.index.rebuild(())
+        self.dirty_lo = 0
+        self.dirty_hi = len(self.lines) - 1
+
+    @property
+    def line_count(self):
+        return len(self.lines)
+
+    def nearby_names(self, line, radius=50):
+        """Имена из строк в пределах radius от line"""
+        names = set()
+        for line_names in self.lines[max(0, line - radius):line + radius + 1]:
+            if line_names:
+                names.update(line_names)
+        return names
+
+    def splice(self, first, old_last, new_last):
+        """Строки first..old_last заменены строками first..new_last"""
+        if new_last < first:
+            # Участок занижен на склеенные строки - расширяем его, чтобы
+            # не потерять слоты строк и не получить перевёрнутый грязный участок
+            old_last += first - new_last
+            new_last = first
+        for names in self.lines[first:old_last + 1]:
+            if names:
+                self._release(names)
+        for imports in self.line_imports[first:old_last + 1]:
+            if imports:
+                self._release_imports(imports)
+        self.lines[first:old_last + 1] = [None] * (new_last - first + 1)
+        self.line_imports[first:old_last + 1] = [None] * (new_last - first + 1)
+        if self.dirty_lo is None:
+            self.dirty_lo, self.dirty_hi = first, new_last
+            return
+        delta = new_last - old_last
+        lo, hi = self.dirty_lo, self.dirty_hi
+        if lo > old_last:
+            lo += delta
+        if hi > old_last:
+            hi += delta
+        else:
+            hi = min(hi, new_last)
+        self.dirty_lo = min(lo, first)
+        self.dirty_hi = max(hi, new_last)
+
+    def stale_runs(self):
+        """Участки (first, last) грязного участка с непосчитанными именами.
+
+        Грязный участок - одна оболочка всех правок: между двумя далёкими
+        правками лежат строки, имена которых известны, их не перечитываем.
+        """
+        runs = []
+        lines = self.lines
+        line, hi = self.dirty_lo, self.dirty_hi
+        while line <= hi:
+            try:
+                line = lines.index(None, line, hi + 1)
+            except ValueError:
+                break
+            last = line
+            while last < hi and lines[last + 1] is None:
+                last += 1
+            runs.append((line, last))
+            line = last + 1
+        return runs
+
+    def refresh(self, read_lines):
+        """Пересчитывает имена изменённых строк и снимает грязный участок;
+        read_lines(first, last) возвращает список текстов этих строк"""
+        for first, last in self.stale_runs():
+            self.update(first, read_lines(first, last))
+        self.dirty_lo = self.dirty_hi = None
+
+    def update(self, first, lines):
+        """Пересчитывает имена строк first.. по их тексту"""
+        for line, text in enumerate(lines, first):
+            old = self.lines[line]
+            if old:
+                self._release(old)
+            names = tuple(set(extract_names(text)))
+            self.lines[line] = names
+            if names:
+                self._acquire(names)
+            old = self.line_imports[line]
+            if old:
+                self._release_imports(old)
+            imports = tuple(extract_imports(text)) if 'import' in text else ()
+            self.line_imports[line] = imports
+            for alias, module in imports:
+                modules = self.aliases.setdefault(alias, {})
+                modules[module] = modules.get(module, 0) + 1
+
+    def resolve_module(self, name):
+        """Полное имя модуля для имени с точками: np.linalg -> numpy.linalg"""
+        first, dot, rest = name.partition('.')
+        modules = self.aliases.get(first)
+        if not modules:
+            return name
+        return next(iter(modules)) + dot + rest
+
+    def is_imported(self, name):
+        """Начинается ли имя с точками с имени, импортированного в буфере"""
+        return name.partition('.')[0] in self.aliases
+
+    def _release_imports(self, imports):
+        for alias, module in imports:
+            modules = self.aliases[alias]
+            if modules[module] > 1:
+                modules[module] -= 1
+            else:
+                del modules[module]
+                if not modules:
+                    del self.aliases[alias]
+
+    def _acquire(self, names):
+        counts = self.counts
+        for name in names:
+            count = counts.get(name, 0)
+            if not count:
+                self.index.add(name)
+            counts[name] = count + 1
+
+    def _release(self, names):
+        counts = self.counts
+        for name in names:
+            count = counts[name] - 1
+            if count:
+                counts[name] = count
+            else:
+                del counts[name]
+                self.index.discard(name)
@@ -0,0 +1,147 @@
+import tkinter as tk
+import tkinter.font as tkfont
+from ui.theme import THEMES
+
+TAB_FONT = ("Consolas", 10, "bold")
+DIRTY_MARK = " •"
+
+
+class TabBar:
+    """Панель вкладок.
+
+    Виджеты вкладки создаются один раз и потом только перенастраиваются,
+    когда у неё меняется заголовок, признак изменения или активность.
+    Вкладки, которые не влезают по ширине, скрываются и доступны из меню «»».
+    """
+
+    def __init__(self, parent, ide):
+        self.ide = ide
+        self.current_theme = getattr(ide, 'current_theme', 'Тёмная')
+        theme = THEMES[self.current_theme]
+        self.frame = tk.Frame(parent, bg=theme["editor_bg"], height=28)
+        self.strip = tk.Frame(self.frame, bg=theme["editor_bg"])
+        self.strip.pack(side="left")
+        self.add_btn = tk.Button(self.frame, text="+", bd=0, bg=theme["editor_bg"], fg="#aaa", font=("Arial", 12, "bold"), command=ide.open_file)
+        self.add_btn.pack(side="left", padx=(4, 0))
+        self.overflow_btn = tk.Button(self.frame, text="»", bd=0, bg=theme["editor_bg"], fg="#aaa", font=("Arial", 12, "bold"), command=self._show_overflow_menu)
+        self.overflow_visible = False
+        self._font = None
+
+        self.items = {}  # id(вкладки) -> виджеты и последнее показанное состояние
+        self.tabs = []
+        self.active = None
+        self.first = 0  # индекс первой показанной вкладки
+        self.shown = []  # id показанных вкладок в порядке упаковки
+        self.frame.bind("<Configure>", lambda e: self._layout())
+
+    def update(self, tabs, active):
+        """Приводит панель к списку вкладок, трогая только изменившиеся виджеты"""
+        keys = {id(tab) for tab in tabs}
+        for key in [key for key in self.items if key not in keys]:
+            self.items.pop(key)["frame"].destroy()
+            if key in self.shown:
+                self.shown.remove(key)
+        for tab in tabs:
+            item = self.items.get(id(tab))
+            if item is None:
+                item = self.items[id(tab)] = self._create_item(tab)
+            self._refresh_item(item, tab is active)
+        self.tabs = list(tabs)
+        self.active = active
+        self._layout()
+
+    def set_theme(self, theme_name):
+        self.current_theme = theme_name
+        theme = THEMES[theme_name]
+        for w in (self.frame, self.strip, self.add_btn, self.overflow_btn):
+            w.config(bg=theme["editor_bg"])
+        # Вкладки перенастроятся при следующем update: тема входит в их состояние
+
+    def _create_item(self, tab):
+        f = tk.Frame(self.strip, bd=0, relief="flat")
+        btn = tk.Button(f, bd=0, font=TAB_FONT, command=lambda t=tab: self.ide._switch_tab(t))
+        btn.pack(side="left")
+        close_btn = tk.Button(f, text="✕", bd=0, fg="#e06c75", font=("Arial", 9), command=lambda t=tab: self.ide._close_tab(t))
+        close_btn.pack(side="left")
+        return {"tab": tab, "frame": f, "btn": btn, "close": close_btn, "state": None, "width": 0}
+
+    def _refresh_item(self, item, is_active):
+        tab = item["tab"]
+        title = tab["name"] + (DIRTY_MARK if tab.get("dirty") else "")
+        state = (title, is_active, self.current_theme)
+        if state == item["state"]:
+            return
+        theme = THEMES[self.current_theme]
+        bg = theme.get("output_bg", "#222") if is_active else theme["editor_bg"]
+        fg = theme["editor_fg"] if is_active else "#aaa"
+        item["frame"].config(bg=bg)
+        item["btn"].config(text=title, bg=bg, fg=fg, activebackground=theme["output_bg"])
+        item["close"].config(bg=bg, activebackground=theme["output_bg"])
+        if title != (item["state"] or ("",))[0]:
+            # Ширину считаем по шрифту: у ещё не отрисованной кнопки её нет
+            if self._font is None:
+                self._font = tkfont.Font(font=TAB_FONT)
+            item["width"] = self._font.measure(title) + 30
+        item["state"] = state
+
+    def _visible_range(self):
+        """Диапазон вкладок, который влезает в панель и содержит активную"""
+        count = len(self.tabs)
+        available = self.frame.winfo_width() - 60  # место под кнопки + и »
+        if self.frame.winfo_width() <= 1:
+            # Панель ещё не размещена - показываем всё
+            return 0, count
+        widths = [self.items[id(tab)]["width"] for tab in self.tabs]
+        first = min(self.first, max(count - 1, 0))
+        active = next((i for i, tab in enumerate(self.tabs) if tab is self.active), None)
+        if active is not None and active < first:
+            first = active
+
+        def fit(start):
+            end, used = start, 0
+            while end < count and (used + widths[end] <= available or end == start):
+                used += widths[end]
+                end += 1
+            return end
+
+        end = fit(first)
+        while active is not None and active >= end:
+            first += 1
+            end = fit(first)
+        # Если справа осталось место, показываем и вкладки слева
+        while first > 0 and sum(widths[first - 1:end]) <= available:
+            first -= 1
+        return first, end
+
+    def _layout(self):
+        first, end = self._visible_range()
+        self.first = first
+        shown = [id(tab) for tab in self.tabs[first:end]]
+        if shown != self.shown:
+            for key in self.shown:
+                self.items[key]["frame"].pack_forget()
+            for key in shown:
+                self.items[key]["frame"].pack(side="left", padx=(0, 2), pady=2)
+            self.shown = shown
+        overflow = end - first < len(self.tabs)
+        if overflow != self.overflow_visible:
+            if overflow:
+                self.overflow_btn.pack(side="right", padx=(0, 4))
+            else:
+                self.overflow_btn.pack_forget()
+            self.overflow_visible = overflow
+
+    def _show_overflow_menu(self):
+        theme = THEMES[self.current_theme]
+        menu = tk.Menu(self.frame, tearoff=0)
+        menu.config(bg=theme["editor_bg"], fg=theme["editor_fg"],
+                   activebackground=theme["output_bg"], activeforeground=theme["output_fg"])
+        for tab in self.tabs:
+            label = tab["name"] + (DIRTY_MARK if tab.get("dirty") else "")
+            if tab is self.active:
+                label = "▸ " + label
+            menu.add_command(label=label, command=lambda t=tab: self.ide._switch_tab(t))
+        try:
+            menu.tk_popup(self.overflow_btn.winfo_rootx(), self.overflow_btn.winfo_rooty() + self.overflow_btn.winfo_height())
+        finally:
+            menu.grab_release()
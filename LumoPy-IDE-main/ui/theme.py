@@ -22,6 +22,35 @@ THEMES = {
     }
 }
 
+# Цвета классов подсветки синтаксиса (см. STYLE_CLASSES в ui/highlighter.py)
+_DARK_SYNTAX = {
+    "keyword": "#569CD6",
+    "builtin": "#4EC9B0",
+    "string": "#D69D85",
+    "comment": "#6A9955",
+    "operator": "#B4B4B4",
+    "function": "#DCDCAA",
+    "attribute": "#9CDCFE",
+    "number": "#B5CEA8",
+    "error": "#F44747"
+}
+_LIGHT_SYNTAX = {
+    "keyword": "#0000FF",
+    "builtin": "#267F99",
+    "string": "#A31515",
+    "comment": "#008000",
+    "operator": "#000000",
+    "function": "#795E26",
+    "attribute": "#001080",
+    "number": "#098658",
+    "error": "#CD3131"
+}
+SYNTAX_COLORS = {
+    "Тёмная": _DARK_SYNTAX,
+    "Светлая": _LIGHT_SYNTAX,
+    "Сепия": _LIGHT_SYNTAX
+}
+
 menu_hover_colors = {
     "Тёмная": "#292929",
     "Светлая": "#e0e0e0",